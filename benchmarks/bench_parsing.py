@@ -0,0 +1,140 @@
+"""Micro-benchmark for the HTML parsing layer.
+
+Times dashboard, course and resource page parsing over the saved Moodle pages in fixtures/
+with every parser backend that is installed, next to the original html.parser code.
+
+    python3 benchmarks/bench_parsing.py [--iterations N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+import time
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from isb_lms import parsing
+from isb_lms.utils import sanitize_filename
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+DASHBOARD_URL = "https://elearn.isb.edu/my/"
+
+# --- Original implementations, kept here as the baseline ---
+
+def legacy_dashboard(dashboard_html):
+    """The original dashboard walk, including its `link in container.find_all(...)` check per link."""
+    soup = BeautifulSoup(dashboard_html, 'html.parser')
+    courses_to_download = []
+    section_header_pattern = re.compile(r'(Term\s+\d+|Block\s*Week[\s\d]*)', re.IGNORECASE)
+    possible_headers = soup.find_all(['h2', 'h3', 'h4', 'div', 'span'], string=section_header_pattern)
+    if not possible_headers:
+        for link in soup.select('div.coursebox > div.info > h3.coursename > a, a.coursename[href*="/course/view.php"]'):
+            course_name = link.get_text(strip=True)
+            course_url = link.get('href')
+            if course_name and course_url:
+                abs_url = urljoin(DASHBOARD_URL, course_url)
+                if not any(c['url'] == abs_url for c in courses_to_download):
+                    courses_to_download.append({"term": "Unknown_Section", "name": sanitize_filename(course_name), "url": abs_url})
+        return courses_to_download
+    processed_urls = set()
+    for header_el in possible_headers:
+        header_text = header_el.get_text(strip=True)
+        match = section_header_pattern.search(header_text)
+        if match:
+            section_folder_name = sanitize_filename(match.group(1).strip()).replace(' ', '_')
+        else:
+            section_folder_name = sanitize_filename(header_text).replace(' ', '_') or "Unnamed_Section"
+        container = header_el.find_next_sibling(['ul', 'div'])
+        if not container:
+            current_el = header_el
+            while True:
+                next_s = current_el.find_next_sibling()
+                if not next_s or next_s.name in ['h2','h3','h4']: break
+                if next_s.name in ['ul','div']: container = next_s; break
+                current_el = next_s
+        if not container: container = header_el.parent
+        if container:
+            for link in container.select('a[href*="/course/view.php?id="]'):
+                if link in container.find_all('a', recursive=True):
+                    course_name = link.get_text(strip=True)
+                    course_url = link.get('href')
+                    abs_course_url = urljoin(DASHBOARD_URL, course_url)
+                    if course_name and course_url and abs_course_url not in processed_urls:
+                        courses_to_download.append({"term": section_folder_name, "name": sanitize_filename(course_name),
+                                                    "url": abs_course_url})
+                        processed_urls.add(abs_course_url)
+    return courses_to_download
+
+def legacy_course_links(course_html):
+    course_soup = BeautifulSoup(course_html, 'html.parser')
+    links = []
+    for link in course_soup.select(parsing.COURSE_RESOURCE_SELECTOR):
+        href = link.get('href')
+        link_text_element = link.find('span', class_='instancename')
+        link_text = link_text_element.get_text(strip=True) if link_text_element else link.get_text(strip=True)
+        if href: links.append((href, link_text))
+    return links
+
+def legacy_resource_pdf_href(resource_html):
+    res_soup = BeautifulSoup(resource_html, 'html.parser')
+    element = res_soup.select_one(parsing.RESOURCE_PDF_SELECTOR)
+    if element is None: return None
+    return element.get('href') or element.get('data') or element.get('src') or ""
+
+def quiet_dashboard(dashboard_html, backend):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return parsing.parse_dashboard_courses(dashboard_html, DASHBOARD_URL, backend)
+
+def available_backends():
+    backends = ["html.parser"]
+    if parsing.BS4_TREE_BUILDER == "lxml": backends.append("lxml")
+    if parsing.SelectolaxParser: backends.append("selectolax")
+    return backends
+
+def time_call(func, html, iterations, *args):
+    """Returns (best seconds per call, result of the last call)."""
+    best = float('inf')
+    result = None
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = func(html, *args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20, help="Runs per case; the best time is reported")
+    args = parser.parse_args()
+
+    pages = {}
+    for name in ("dashboard", "course", "resource"):
+        with open(os.path.join(FIXTURES_DIR, f"{name}.html"), encoding='utf-8') as f:
+            pages[name] = f.read()
+
+    cases = [
+        ("dashboard", quiet_dashboard, legacy_dashboard),
+        ("course", parsing.extract_course_links, legacy_course_links),
+        ("resource", parsing.extract_resource_pdf_href, legacy_resource_pdf_href),
+    ]
+    print(f"{'page':<10} {'backend':<12} {'ms/call':>9} {'speedup':>8}")
+    for page, func, legacy in cases:
+        html = pages[page]
+        baseline = None
+        if legacy:
+            baseline, expected = time_call(legacy, html, args.iterations)
+            print(f"{page:<10} {'original':<12} {baseline * 1000:>9.2f} {'1.00x':>8}")
+        for backend in available_backends():
+            # The dashboard needs BeautifulSoup's tree navigation, so selectolax does not apply to it
+            if page == "dashboard" and backend == "selectolax": continue
+            seconds, result = time_call(func, html, args.iterations, backend)
+            if baseline is None:
+                baseline, expected = seconds, result
+            note = "" if result == expected else "  (RESULT DIFFERS)"
+            print(f"{page:<10} {backend:<12} {seconds * 1000:>9.2f} {baseline / seconds:>7.2f}x{note}")
+
+if __name__ == "__main__":
+    main()
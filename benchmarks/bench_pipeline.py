@@ -0,0 +1,137 @@
+"""End-to-end throughput benchmark against the local Moodle stand-in.
+
+Starts moodle_stub_server in this process, writes a saved login session for it so the scraper
+skips Chrome, then runs `python3 -m isb_lms` as a subprocess with LMS_DASHBOARD_URL pointing
+at the stub. Reports files/s, MB/s, time to first byte per stage and the scraper's peak RSS.
+
+    python3 benchmarks/bench_pipeline.py --courses 12 --files-per-course 30 --latency-ms 40
+    python3 benchmarks/bench_pipeline.py --runs 2 --json results.json  # second run measures an incremental sync
+    python3 benchmarks/bench_pipeline.py --scraper-args "--workers 8 --rate 50"
+
+Peak RSS comes from getrusage, so it is only reported on Linux and macOS.
+"""
+import argparse
+import json
+import os
+import shlex
+import subprocess
+import sys
+import tempfile
+import time
+
+from moodle_stub_server import STUB_SESSION_COOKIE, StubConfig, StubServer
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def write_session_store(path):
+    """Saves a login session for the stub, in the scraper's session store format."""
+    now = time.time()
+    store = {"saved_at": now, "expires_at": now + 3600,
+             "cookies": [{"name": "MoodleSession", "value": STUB_SESSION_COOKIE, "path": "/"}]}
+    with open(path, "w") as f:
+        json.dump(store, f)
+
+def peak_child_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def latest_run_report(download_dir):
+    """Returns the JSON run report the scraper wrote last, or None."""
+    report_dir = os.path.join(download_dir, ".lms_runs")
+    if not os.path.isdir(report_dir):
+        return None
+    reports = sorted(name for name in os.listdir(report_dir) if name.endswith(".json"))
+    if not reports:
+        return None
+    with open(os.path.join(report_dir, reports[-1])) as f:
+        return json.load(f)
+
+def run_once(server, work_dir, log_path, scraper_args):
+    """Runs the scraper once against the stub and returns the measurements."""
+    env = dict(os.environ,
+               LMS_DASHBOARD_URL=f"{server.base_url}/my/",
+               LMS_DOWNLOAD_DIR=os.path.join(work_dir, "downloads"),
+               LMS_SESSION_STORE=os.path.join(work_dir, "session.json"),
+               PYTHONUNBUFFERED="1")
+    write_session_store(env["LMS_SESSION_STORE"])
+    server.reset()
+    start = time.monotonic()
+    with open(log_path, "w") as log:
+        exit_code = subprocess.call([sys.executable, "-m", "isb_lms", *scraper_args], cwd=REPO_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    elapsed = time.monotonic() - start
+
+    scraper_report = latest_run_report(env["LMS_DOWNLOAD_DIR"]) or {}
+    stages = server.stats()
+    pdf = stages.get("pdf", {})
+    files = pdf.get("status_counts", {}).get("200", 0) + pdf.get("status_counts", {}).get("206", 0)
+    return {
+        "exit_code": exit_code,
+        "wall_s": round(elapsed, 3),
+        "pdf_files_transferred": files,
+        "files_per_s": round(files / elapsed, 2),
+        "mb_per_s": round(pdf.get("bytes", 0) / elapsed / 1e6, 2),
+        "peak_rss_mb": peak_child_rss_mb(),
+        "stages": stages,
+        "scraper_stages": scraper_report.get("stages", {}),
+        "scraper_gauges": scraper_report.get("gauges", {}),
+        "scraper_events": scraper_report.get("events", {}),
+        "log": log_path,
+    }
+
+def print_result(label, result):
+    print(f"\n== {label} ==")
+    print(f"exit code {result['exit_code']}, wall {result['wall_s']}s, "
+          f"{result['pdf_files_transferred']} PDFs transferred, "
+          f"{result['files_per_s']} files/s, {result['mb_per_s']} MB/s, peak RSS {result['peak_rss_mb']} MB")
+    print(f"{'stage':<10} {'requests':>8} {'MB':>8} {'mean TTFB ms':>13} {'first byte s':>13} {'last byte s':>12}  statuses")
+    for name, stats in result["stages"].items():
+        print(f"{name:<10} {stats['requests']:>8} {stats['bytes'] / 1e6:>8.2f} {stats['mean_ttfb_ms']:>13} "
+              f"{stats['first_byte_at_s']:>13} {stats['last_byte_at_s']:>12}  {stats['status_counts']}")
+    if result["scraper_stages"]:
+        print("scraper stages: " + ", ".join(f"{name} {stage['total_s']}s" for name, stage in result["scraper_stages"].items()))
+    print(f"scraper output: {result['log']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the scraper against a local Moodle stand-in.")
+    parser.add_argument("--courses", type=int, default=8)
+    parser.add_argument("--files-per-course", type=int, default=20)
+    parser.add_argument("--file-size", type=int, default=512 * 1024, help="Bytes per PDF")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Added to every response")
+    parser.add_argument("--bandwidth-kbps", type=float, default=0, help="KiB/s per connection, 0 for unlimited")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of PDF requests that fail")
+    parser.add_argument("--runs", type=int, default=1, help="Repeat into the same folder to measure incremental syncs")
+    parser.add_argument("--json", help="Also write the results to this file")
+    parser.add_argument("--scraper-args", default="", help="Extra command line options for the scraper, e.g. \"--workers 8\"")
+    args = parser.parse_args()
+
+    config = StubConfig(args.courses, args.files_per_course, args.file_size, args.latency_ms / 1000,
+                        args.bandwidth_kbps * 1024, args.failure_rate)
+    server = StubServer(config)
+    server.start_in_background()
+    work_dir = tempfile.mkdtemp(prefix="lms_bench_")
+    print(f"Stub Moodle on {server.base_url}: {args.courses} courses x {args.files_per_course} files "
+          f"of {args.file_size / 1024:.0f} KiB, latency {args.latency_ms} ms, failure rate {args.failure_rate}")
+    print(f"Working directory: {work_dir}")
+
+    results = []
+    try:
+        for run in range(1, args.runs + 1):
+            result = run_once(server, work_dir, os.path.join(work_dir, f"run{run}.log"), shlex.split(args.scraper_args))
+            results.append(result)
+            print_result(f"run {run}" + (" (cold)" if run == 1 else " (incremental)"), result)
+    finally:
+        server.shutdown()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": vars(args), "runs": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
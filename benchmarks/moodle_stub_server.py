@@ -0,0 +1,381 @@
+"""A local stand-in for the ISB Moodle site, for benchmarking the scraper offline.
+
+Serves a synthetic dashboard, course pages, filewithwatermark pages (which redirect to the PDF),
+resource pages (HTML linking to the PDF) and the PDFs themselves, with configurable latency,
+per-connection bandwidth and failure rate. Requests are only answered with content when they
+carry the MoodleSession cookie STUB_SESSION_COOKIE; anything else is redirected to a login page.
+
+Run on its own to browse it, or use it from bench_pipeline.py:
+
+    python3 benchmarks/moodle_stub_server.py --port 8765
+"""
+import argparse
+import hashlib
+import random
+import re
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+STUB_SESSION_COOKIE = "bench-session"
+SECTIONS = ["Term 4", "Term 5", "Term 6", "Block Week 2"]
+SERVER_START_TIME = formatdate(usegmt=True)
+LOGIN_PAGE = b'<!DOCTYPE html><html><body id="page-login-index"><form action="/login/index.php" method="post"></form></body></html>'
+
+class StubConfig:
+    """Shape and behaviour of the stub site."""
+
+    def __init__(self, courses=8, files_per_course=20, file_size=512 * 1024, latency=0.02,
+                 bandwidth=0, failure_rate=0.0, shared_files=2, seed=1):
+        self.courses = courses
+        self.files_per_course = files_per_course
+        self.file_size = file_size # Bytes per PDF
+        self.latency = latency # Seconds added before every response
+        self.bandwidth = bandwidth # Bytes/s per connection for PDF bodies, 0 for unlimited
+        self.failure_rate = failure_rate # Share of PDF requests answered with a 503 or cut off halfway
+        self.shared_files = shared_files # PDFs that appear in every course, like a shared syllabus
+        self.seed = seed
+
+class StageStats:
+    """Request counts, bytes and time-to-first-byte for one kind of page."""
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.ttfb_total = 0.0
+        self.first_byte_at = None # Seconds since StubServer.reset()
+        self.last_byte_at = None
+        self.status_counts = {}
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "bytes": self.bytes,
+            "mean_ttfb_ms": round(1000 * self.ttfb_total / self.requests, 2) if self.requests else None,
+            "first_byte_at_s": round(self.first_byte_at, 3) if self.first_byte_at is not None else None,
+            "last_byte_at_s": round(self.last_byte_at, 3) if self.last_byte_at is not None else None,
+            "status_counts": dict(sorted(self.status_counts.items())),
+        }
+
+STUB_WORDS = ("valuation", "strategy", "marketing", "regression", "leadership", "supply", "chain",
+              "pricing", "equity", "negotiation", "operations", "forecast", "portfolio", "ethics")
+
+def pdf_bytes(file_id, size):
+    """Deterministic one-page PDF for a file id, with extractable text, padded to about size bytes."""
+    rng = random.Random(file_id)
+    text = f"Stub lecture notes {file_id} " + " ".join(rng.choice(STUB_WORDS) for _ in range(12))
+    content = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 5 0 R >> >> /Contents 4 0 R >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(content), content),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    # Comment lines between the objects and the xref make up the size without changing the document
+    filler = hashlib.sha256(str(file_id).encode()).hexdigest().encode()
+    while len(out) < size - 400:
+        out += b"%" + filler[:min(64, size - 400 - len(out))] + b"\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+def page(title, body_id, main_html):
+    return f"""<!DOCTYPE html>
+<html><head><title>{title}</title></head>
+<body id="{body_id}">
+<nav class="navbar"><div class="usermenu"><a href="/login/logout.php">Log out</a></div></nav>
+<div id="page"><section id="region-main"><div role="main">
+{main_html}
+</div></section></div>
+</body></html>
+"""
+
+class StubSite:
+    """Builds the synthetic course catalogue and renders its pages."""
+
+    def __init__(self, config):
+        self.config = config
+        rng = random.Random(config.seed)
+        self.courses = {} # course id -> (section, name, [activity dicts])
+        shared = [{"kind": "filewithwatermark", "id": 90000 + i, "name": f"Programme Handbook {i}"}
+                  for i in range(config.shared_files)]
+        next_id = 1000
+        for index in range(config.courses):
+            course_id = 100 + index
+            activities = list(shared)
+            for _ in range(config.files_per_course - len(shared)):
+                next_id += 1
+                kind = rng.choice(["filewithwatermark", "filewithwatermark", "resource", "direct"])
+                activities.append({"kind": kind, "id": next_id, "name": f"Reading {next_id}"})
+            section = SECTIONS[index % len(SECTIONS)]
+            self.courses[course_id] = (section, f"Course {course_id} {section}", activities)
+        self.files = {a["id"]: a["name"] for _, _, acts in self.courses.values() for a in acts}
+        self.next_id = next_id
+        self.rng = rng
+        self.lock = threading.Lock()
+
+    def post_reading(self):
+        """Adds a new reading to a random course, like a professor posting mid-term. Returns the course id."""
+        with self.lock:
+            self.next_id += 1
+            course_id = self.rng.choice(list(self.courses))
+            name = f"Reading {self.next_id}"
+            self.courses[course_id][2].append({"kind": "filewithwatermark", "id": self.next_id, "name": name})
+            self.files[self.next_id] = name
+        return course_id
+
+    def course_etag(self, course_id):
+        return f'"course-{course_id}-{len(self.courses[course_id][2])}"'
+
+    def dashboard(self):
+        parts = []
+        for section in SECTIONS:
+            items = "".join(
+                f'<li class="course-listitem"><a class="aalink coursename" href="/course/view.php?id={cid}">{name}</a></li>\n'
+                for cid, (sec, name, _) in self.courses.items() if sec == section
+            )
+            if items:
+                parts.append(f'<h3 class="sectionname">{section} Courses</h3>\n<ul class="list-group">\n{items}</ul>')
+        return page("Dashboard", "page-my-index", "\n".join(parts))
+
+    def course(self, course_id):
+        section, name, activities = self.courses[course_id]
+        items = []
+        with self.lock:
+            activities = list(activities)
+        for act in activities:
+            if act["kind"] == "direct":
+                items.append(f'<li class="activity label modtype_label"><p><a href="/pluginfile.php/{act["id"]}/mod_label/intro/{act["name"]}.pdf">{act["name"]}.pdf</a></p></li>')
+            else:
+                items.append(
+                    f'<li class="activity modtype_{act["kind"]}"><div class="activityinstance">'
+                    f'<a class="aalink" href="/mod/{act["kind"]}/view.php?id={act["id"]}">'
+                    f'<span class="instancename">{act["name"]}<span class="accesshide"> File</span></span></a></div></li>'
+                )
+        body = f'<h2>{name}</h2>\n<div class="course-content"><ul class="topics"><li class="section main"><ul class="section">\n' \
+               + "\n".join(items) + "\n</ul></li></ul></div>"
+        return page(name, "page-course-view-topics", body)
+
+    def resource(self, file_id):
+        name = self.files[file_id]
+        link = f"/pluginfile.php/{file_id}/mod_resource/content/1/{name}.pdf"
+        return page(name, "page-mod-resource-view",
+                    f'<div class="resourceworkaround">Click <a href="{link}">{name}.pdf</a> link to view the file.</div>')
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # Keep-alive, so the scraper's connection pool is exercised
+
+    def log_message(self, *args):
+        pass
+
+    def do_HEAD(self):
+        self.handle_request(head=True)
+
+    def do_GET(self):
+        self.handle_request(head=False)
+
+    def handle_request(self, head):
+        server = self.server
+        received = time.monotonic()
+        time.sleep(server.config.latency)
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        stage = "other"
+        try:
+            if url.path.startswith("/login/"):
+                return self.send_body(stage, received, 200, "text/html", LOGIN_PAGE, head)
+            if f"MoodleSession={STUB_SESSION_COOKIE}" not in (self.headers.get("Cookie") or ""):
+                return self.send_redirect(stage, received, "/login/index.php")
+            if url.path == "/my/":
+                stage = "dashboard"
+                return self.send_body(stage, received, 200, "text/html", server.site.dashboard().encode(), head)
+            if url.path == "/course/view.php":
+                stage = "course"
+                course_id = int(query["id"][0])
+                etag = server.site.course_etag(course_id)
+                if self.headers.get("If-None-Match") == etag:
+                    return self.send_body(stage, received, 304, "text/html", b"", head, [("ETag", etag)])
+                return self.send_body(stage, received, 200, "text/html", server.site.course(course_id).encode(), head,
+                                      [("ETag", etag)])
+            if url.path == "/mod/filewithwatermark/view.php":
+                stage = "resource"
+                file_id = int(query["id"][0])
+                return self.send_redirect(stage, received, f"/pluginfile.php/{file_id}/mod_filewithwatermark/content/0/{server.site.files[file_id]}.pdf")
+            if url.path == "/mod/resource/view.php":
+                stage = "resource"
+                return self.send_body(stage, received, 200, "text/html", server.site.resource(int(query["id"][0])).encode(), head)
+            match = re.match(r"/pluginfile\.php/(\d+)/", url.path)
+            if match:
+                stage = "pdf"
+                return self.send_pdf(stage, received, int(match.group(1)), head)
+            self.send_body(stage, received, 404, "text/plain", b"not found", head)
+        except (KeyError, ValueError):
+            self.send_body(stage, received, 404, "text/plain", b"not found", head)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def send_redirect(self, stage, received, location):
+        self.send_response(303)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+        self.server.record(stage, received, 303, 0)
+
+    def send_body(self, stage, received, status, content_type, body, head, extra_headers=()):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in extra_headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.server.record(stage, received, status, 0 if head else len(body), head)
+        if not head:
+            self.wfile.write(body)
+
+    def send_pdf(self, stage, received, file_id, head):
+        config = self.server.config
+        data = pdf_bytes(file_id, config.file_size)
+        etag = f'"{file_id}-{len(data)}"'
+        headers = [("ETag", etag), ("Last-Modified", SERVER_START_TIME), ("Accept-Ranges", "bytes"),
+                   ("Content-Disposition", f'inline; filename="{self.server.site.files[file_id]}.pdf"')]
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            for name, value in headers:
+                self.send_header(name, value)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            self.server.record(stage, received, 304, 0)
+            return
+        if not head and self.server.should_fail():
+            if self.server.rng_choice():
+                self.send_body(stage, received, 503, "text/plain", b"busy", head, [("Retry-After", "1")])
+                return
+            # Announce the full file with its usual validators, then drop the connection halfway through,
+            # so the scraper can resume the rest with a Range request
+            self.send_response(200)
+            self.send_header("Content-Type", "application/pdf")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in headers:
+                self.send_header(name, value)
+            self.end_headers()
+            self.server.record(stage, received, "cut", len(data) // 2)
+            self.wfile.write(data[:len(data) // 2])
+            self.close_connection = True
+            return
+
+        status, start = 200, 0
+        range_match = re.match(r"bytes=(\d+)-$", self.headers.get("Range") or "")
+        if range_match and self.headers.get("If-Range", etag) == etag and int(range_match.group(1)) < len(data):
+            status, start = 206, int(range_match.group(1))
+            headers.append(("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}"))
+        body = data[start:]
+        self.send_response(status)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.server.record(stage, received, status, 0 if head else len(body), head)
+        if head:
+            return
+        if not config.bandwidth:
+            self.wfile.write(body)
+            return
+        chunk = 16 * 1024
+        for offset in range(0, len(body), chunk):
+            self.wfile.write(body[offset:offset + chunk])
+            time.sleep(min(chunk, len(body) - offset) / config.bandwidth)
+
+class StubServer(ThreadingHTTPServer):
+    """Threaded HTTP server holding the stub site and per-stage statistics."""
+
+    daemon_threads = True
+
+    def __init__(self, config, host="127.0.0.1", port=0):
+        super().__init__((host, port), StubHandler)
+        self.config = config
+        self.site = StubSite(config)
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.reset()
+
+    @property
+    def base_url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def reset(self):
+        """Clears the statistics and restarts the clock used for first/last byte times."""
+        with self.lock:
+            self.started = time.monotonic()
+            self.stages = {name: StageStats() for name in ("dashboard", "course", "resource", "pdf", "other")}
+
+    def should_fail(self):
+        with self.lock:
+            return self.rng.random() < self.config.failure_rate
+
+    def rng_choice(self):
+        with self.lock:
+            return self.rng.random() < 0.5
+
+    def record(self, stage, received, status, body_bytes, head=False):
+        now = time.monotonic()
+        if head: status = f"HEAD {status}"
+        with self.lock:
+            stats = self.stages[stage]
+            stats.requests += 1
+            stats.bytes += body_bytes
+            stats.ttfb_total += now - received
+            stats.status_counts[str(status)] = stats.status_counts.get(str(status), 0) + 1
+            at = now - self.started
+            if stats.first_byte_at is None: stats.first_byte_at = at
+            stats.last_byte_at = at
+
+    def stats(self):
+        with self.lock:
+            return {name: stats.as_dict() for name, stats in self.stages.items() if stats.requests}
+
+    def start_in_background(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic ISB Moodle site for offline benchmarking.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--courses", type=int, default=8)
+    parser.add_argument("--files-per-course", type=int, default=20)
+    parser.add_argument("--file-size", type=int, default=512 * 1024, help="Bytes per PDF")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--bandwidth-kbps", type=float, default=0, help="KiB/s per connection, 0 for unlimited")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--post-every", type=float, default=0, metavar="SECONDS",
+                        help="Post a new reading to a random course this often, to exercise watch mode")
+    args = parser.parse_args()
+    config = StubConfig(args.courses, args.files_per_course, args.file_size, args.latency_ms / 1000,
+                        args.bandwidth_kbps * 1024, args.failure_rate)
+    server = StubServer(config, port=args.port)
+    print(f"Stub Moodle serving on {server.base_url}/my/ (cookie MoodleSession={STUB_SESSION_COOKIE})")
+    if args.post_every:
+        def post_forever():
+            while True:
+                time.sleep(args.post_every)
+                print(f"Posted a new reading to course {server.site.post_reading()}")
+        threading.Thread(target=post_forever, daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
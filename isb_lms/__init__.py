@@ -0,0 +1,10 @@
+"""Bulk downloader for ISB LMS (Moodle) course PDFs.
+
+The scraper runs as four stages: discover (dashboard -> courses), resolve (course and resource
+pages -> DownloadJobs), download and report. pipeline.run() wires them together for a Settings;
+cli.main() is the command line on top of it.
+"""
+from .config import Settings
+from .pipeline import run
+
+__all__ = ["Settings", "run"]
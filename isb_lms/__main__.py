@@ -0,0 +1,6 @@
+import sys
+
+from .cli import main
+
+if __name__ == "__main__": # The text indexer's worker processes import this module too
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""Login: the saved session store and the Chrome browser used for the manual login."""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service as ChromeService
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+from webdriver_manager.chrome import ChromeDriverManager
+
+from .net import add_cookies, fetch_page
+from .parsing import COURSE_CONTENT_SELECTOR, LOGGED_IN_SELECTOR
+
+# Cookies that carry the Moodle login; others on the domain (analytics, load balancers) can expire much sooner
+AUTH_COOKIE_PREFIXES = ("MoodleSession", "MOODLEID")
+
+def save_session_store(path, cookies, max_age):
+    """Saves the browser's login cookies along with when they stop being trustworthy."""
+    saved_at = time.time()
+    expires_at = saved_at + max_age
+    for cookie in cookies:
+        if cookie.get('expiry') and cookie.get('name', '').startswith(AUTH_COOKIE_PREFIXES):
+            expires_at = min(expires_at, cookie['expiry'])
+    tmp_path = path + ".tmp"
+    try:
+        # Cookies grant access to the LMS account, so keep the file private to the user
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({"saved_at": saved_at, "expires_at": expires_at, "cookies": cookies}, f)
+        os.replace(tmp_path, path)
+        print(f"Saved login session to {path}")
+    except OSError as e:
+        print(f"   Warning: Could not save login session to {path}: {e}")
+
+def load_session_store(path):
+    """Returns the saved login cookies, or None if there are none or they have expired."""
+    try:
+        with open(path) as f:
+            store = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"   Warning: Ignoring unreadable session store {path}: {e}")
+        return None
+    if time.time() >= store.get("expires_at", 0):
+        print("Saved login session has expired.")
+        return None
+    return store.get("cookies") or None
+
+def copy_driver_cookies(driver, session, verbose=True):
+    """Copies the browser's cookies into the requests session."""
+    add_cookies(session, driver.get_cookies(), verbose)
+
+def start_browser(user_agent):
+    """Starts Chrome through webdriver-manager."""
+    options = webdriver.ChromeOptions()
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument(f"user-agent={user_agent}")
+
+    service = ChromeService(executable_path=ChromeDriverManager().install())
+    return webdriver.Chrome(service=service, options=options)
+
+def wait_for_manual_login(driver, timeout):
+    """Waits for the user to log in in the browser window."""
+    print(f"\n---> Please log in to the LMS in the browser window that just opened. <---")
+    print(f"     You have {timeout} seconds to complete the login.")
+    print("     The script will continue automatically after login detection OR after the timeout.")
+
+    try:
+        WebDriverWait(driver, timeout).until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, LOGGED_IN_SELECTOR))
+        )
+        print("Login detected or timeout reached. Assuming logged in, proceeding...")
+    except Exception as e:
+        print(f"WARNING: Did not detect logged-in state element after {timeout}s (Error: {e}).")
+        print("Attempting to proceed anyway...")
+
+def fetch_page_with_browser(driver, session, url, timeout=30):
+    """Renders a page in the browser and returns its HTML. Callers must hold the browser lock."""
+    driver.get(url)
+    WebDriverWait(driver, timeout).until(
+        EC.presence_of_element_located((By.CSS_SELECTOR, COURSE_CONTENT_SELECTOR))
+    )
+    time.sleep(3)
+    copy_driver_cookies(driver, session, verbose=False) # Update session cookies
+    return driver.page_source
+
+class Browser:
+    """Chrome, started on first use and shared by all worker threads.
+
+    WebDriver is not thread-safe, so everything that touches the driver goes through the lock.
+    login_lock, if given, is a reentrant lock shared with other browsers (batch mode): logins, from checking
+    the saved session to saving the new one, then happen one at a time.
+    """
+
+    def __init__(self, settings, session, limiter, metrics, login_lock=None):
+        self.settings = settings
+        self.session = session
+        self.limiter = limiter
+        self.metrics = metrics
+        self.login_lock = login_lock or nullcontext()
+        self.driver = None
+        self.login_generation = 0 # Bumped on every re-login, so threads that hit the same expiry log in once
+        self.relogin_failed = False
+        self.lock = threading.RLock()
+
+    @contextmanager
+    def logging_in(self):
+        """Held for a whole login. Takes the browser lock before the shared login lock, as every login path does."""
+        with self.lock, self.login_lock:
+            yield
+
+    def ensure(self):
+        """Starts the browser on first use. Logs in manually unless the session cookies are still good."""
+        with self.lock:
+            if self.driver:
+                return self.driver
+        with self.logging_in():
+            if self.driver:
+                return self.driver
+            print("Setting up browser driver...")
+            try:
+                with self.metrics.stage("browser_setup"):
+                    driver = start_browser(self.settings.user_agent)
+                print("Browser driver setup complete.")
+            except Exception as e:
+                print(f"\nFATAL ERROR setting up WebDriver: {e}")
+                print("\nPlease ensure Google Chrome is installed and accessible.")
+                raise
+            self.driver = driver
+
+            dashboard_url = self.settings.dashboard_url
+            print(f"\nNavigating to: {dashboard_url}")
+            driver.get(dashboard_url)
+            if len(self.session.cookies):
+                # Already authenticated over HTTP: hand the cookies to the browser instead of logging in again
+                for cookie in self.session.cookies:
+                    try:
+                        driver.add_cookie({"name": cookie.name, "value": cookie.value, "path": cookie.path or "/"})
+                    except Exception: pass
+                driver.get(dashboard_url)
+            else:
+                with self.metrics.stage("login_wait"):
+                    wait_for_manual_login(driver, self.settings.manual_login_timeout)
+                copy_driver_cookies(driver, self.session)
+                save_session_store(self.settings.session_store, driver.get_cookies(), self.settings.session_max_age)
+            return driver
+
+    def relogin(self, generation):
+        """Logs in again after the session expired mid-run. Returns True if there is a fresh session to retry with.
+
+        generation is the login_generation the caller saw before its request failed. If another thread
+        has logged in again since then, this returns straight away instead of asking for a second login.
+        """
+        with self.logging_in():
+            if generation != self.login_generation:
+                return True
+            if self.relogin_failed:
+                return False
+            print("\nThe LMS session has expired. Logging in again...")
+            try:
+                self.session.cookies.clear()
+                if self.driver:
+                    self.driver.delete_all_cookies()
+                    self.driver.get(self.settings.dashboard_url)
+                    with self.metrics.stage("login_wait"):
+                        wait_for_manual_login(self.driver, self.settings.manual_login_timeout)
+                    copy_driver_cookies(self.driver, self.session)
+                    save_session_store(self.settings.session_store, self.driver.get_cookies(), self.settings.session_max_age)
+                else:
+                    self.ensure() # No cookies left, so this does a manual login
+                # The wait gives up quietly on a timeout, so check the new cookies really get past the login page
+                if not fetch_page(self.session, self.limiter, self.settings.dashboard_url,
+                                  timeout=self.settings.page_timeout, backend=self.settings.html_parser):
+                    raise RuntimeError("the LMS still does not accept the session")
+            except Exception as e:
+                print(f"   ERROR: Could not log in again: {e}")
+                self.relogin_failed = True
+                return False
+            self.login_generation += 1
+            self.metrics.count("relogin")
+            return True
+
+    def dashboard_html(self):
+        """Returns the dashboard as rendered by the browser."""
+        with self.lock:
+            driver = self.ensure()
+            if "/my/" not in driver.current_url:
+                 print("Not on dashboard, redirecting...")
+                 driver.get(self.settings.dashboard_url)
+                 time.sleep(5)
+            return driver.page_source
+
+    def page_html(self, url):
+        """Renders a course page in the browser and returns its HTML."""
+        with self.lock:
+            driver = self.ensure()
+            with self.metrics.stage("course_page_browser"):
+                return fetch_page_with_browser(driver, self.session, url, self.settings.page_timeout)
+
+    def quit(self):
+        with self.lock:
+            if self.driver:
+                print("\nClosing browser...")
+                self.driver.quit()
+                self.driver = None
+                print("Browser closed.")
@@ -0,0 +1,255 @@
+"""Batch mode: several accounts, terms or output folders in one run, sharing one worker pool.
+
+A job file lists the runs to make. Each job has its own session store (i.e. account), filters and
+output folder, and otherwise uses the command line's settings. For example:
+
+    {
+      "parallel_jobs": 2,
+      "workers": 8,
+      "per_account": 4,
+      "jobs": [
+        {"name": "2025 Term 6", "session_store": "~/.isb_2025.json", "sections": ["Term 6"],
+         "output_dir": "~/Archive/2025/Term 6"},
+        {"name": "2026 Term 1", "session_store": "~/.isb_2026.json", "sections": ["Term 1"],
+         "output_dir": "~/Archive/2026/Term 1", "courses": ["Strategy"]}
+      ]
+    }
+
+All jobs share one HostLimiter, so the LMS sees the same request rate and per-host limit as a single
+run, and one pool of download threads. "workers" caps downloads across all jobs, "per_account" caps
+them for jobs using the same session store, and "parallel_jobs" is how many jobs run at once.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import replace
+
+from .metrics import RunMetrics
+from .net import create_limiter
+from .pipeline import run
+
+JOB_KEYS = {"name", "session_store", "output_dir", "sections", "courses", "dashboard_url"}
+
+class FairPool:
+    """Download threads shared by every job in a batch.
+
+    Work is taken from each account in turn, and within an account from each of its jobs in turn,
+    so a job with hundreds of PDFs queued cannot starve the others. Each job submits through its own
+    lane(), which looks like the ThreadPoolExecutor a single run would use.
+    """
+
+    def __init__(self, workers, per_account):
+        self.per_account = per_account
+        self.cond = threading.Condition()
+        self.accounts = OrderedDict() # account -> {"active": n, "lanes": deque of lanes}, in round-robin order
+        self.closed = False
+        self.threads = [threading.Thread(target=self._work, name=f"download-{i}", daemon=True) for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+
+    def lane(self, account):
+        """Returns a new executor-like lane for one job of the account."""
+        lane = FairLane(self, account)
+        with self.cond:
+            self.accounts.setdefault(account, {"active": 0, "lanes": deque()})["lanes"].append(lane)
+        return lane
+
+    def _next_item(self):
+        """Picks the next item fairly and marks it active. Called with the condition held."""
+        for _ in range(len(self.accounts)):
+            account, state = next(iter(self.accounts.items()))
+            self.accounts.move_to_end(account)
+            if state["active"] >= self.per_account:
+                continue
+            lanes = state["lanes"]
+            for _ in range(len(lanes)):
+                lane = lanes[0]
+                lanes.rotate(-1)
+                if lane.items:
+                    state["active"] += 1
+                    lane.active += 1
+                    return lane, lane.items.popleft()
+        return None, None
+
+    def _work(self):
+        while True:
+            with self.cond:
+                lane, item = self._next_item()
+                while item is None:
+                    if self.closed:
+                        return
+                    self.cond.wait()
+                    lane, item = self._next_item()
+            future, fn, args = item
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+            with self.cond:
+                self.accounts[lane.account]["active"] -= 1
+                lane.active -= 1
+                self.cond.notify_all()
+
+    def shutdown(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        for thread in self.threads:
+            thread.join()
+
+class FairLane:
+    """One job's queue in a FairPool, with the submit()/shutdown() of an executor."""
+
+    def __init__(self, pool, account):
+        self.pool = pool
+        self.account = account
+        self.items = deque() # (future, fn, args) not started yet
+        self.active = 0
+
+    def submit(self, fn, *args):
+        future = Future()
+        with self.pool.cond:
+            self.items.append((future, fn, args))
+            self.pool.cond.notify_all()
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        """Stops taking work for this job. Other jobs on the pool are not affected."""
+        with self.pool.cond:
+            if cancel_futures:
+                for future, _, _ in self.items:
+                    future.cancel()
+                self.items.clear()
+            while wait and (self.active or self.items):
+                self.pool.cond.wait()
+            state = self.pool.accounts.get(self.account)
+            if state and self in state["lanes"] and not self.items:
+                state["lanes"].remove(self)
+
+def load_batch(path, base):
+    """Reads a job file. Returns (options, [(name, account, Settings), ...]) or raises ValueError."""
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, list):
+        data = {"jobs": data}
+    entries = data.get("jobs")
+    if not entries:
+        raise ValueError(f"{path} has no jobs")
+    options = {
+        "parallel_jobs": int(data.get("parallel_jobs", 2)),
+        "workers": int(data.get("workers", base.download_workers)),
+    }
+    options["per_account"] = int(data.get("per_account", options["workers"]))
+    jobs = []
+    for number, entry in enumerate(entries, 1):
+        unknown = set(entry) - JOB_KEYS
+        if unknown:
+            raise ValueError(f"job {number} in {path} has unknown keys: {', '.join(sorted(unknown))}")
+        if not entry.get("output_dir"):
+            raise ValueError(f"job {number} in {path} needs an output_dir")
+        session_store = os.path.abspath(os.path.expanduser(entry.get("session_store", base.session_store)))
+        settings = replace(
+            base,
+            download_dir=os.path.abspath(os.path.expanduser(entry["output_dir"])),
+            session_store=session_store,
+            dashboard_url=entry.get("dashboard_url", base.dashboard_url),
+            sections=list(entry.get("sections", base.sections)),
+            courses=list(entry.get("courses", base.courses)),
+            download_workers=options["per_account"],
+        )
+        jobs.append((entry.get("name") or f"job {number}", session_store, settings))
+    outputs = [settings.download_dir for _, _, settings in jobs]
+    if len(set(outputs)) != len(outputs):
+        raise ValueError(f"jobs in {path} must each have their own output_dir") # They would share a manifest
+    return options, jobs
+
+def run_batch(base, path):
+    """Runs every job in the job file over a shared pool. Returns the list of job results, or None."""
+    try:
+        options, jobs = load_batch(path, base)
+    except (OSError, ValueError) as e:
+        print(f"ERROR: Could not read the batch file {path}: {e}")
+        return None
+    print(f"Running {len(jobs)} jobs, {options['parallel_jobs']} at a time, with {options['workers']} download workers "
+          f"({options['per_account']} per account).")
+
+    metrics = RunMetrics() # Batch-wide: the shared limiter's retries and throttling
+    limiter = create_limiter(base, metrics)
+    pool = FairPool(options["workers"], options["per_account"])
+    login_lock = threading.RLock() # One login at a time, so it is clear which account Chrome wants
+
+    def run_job(name, account, settings):
+        print(f"\n=== Job: {name} ({settings.download_dir}) ===")
+        job_metrics = RunMetrics()
+        started = time.monotonic()
+        summary = None
+        try:
+            summary = run(settings, limiter=limiter, metrics=job_metrics, download_pool=pool.lane(account),
+                          login_lock=login_lock)
+        except Exception as e:
+            print(f"   ERROR: Job {name} failed: {e}")
+        outcomes, transferred = job_metrics.file_totals()
+        result = {
+            "name": name, "account": account, "output_dir": settings.download_dir,
+            "sections": settings.sections, "courses": settings.courses,
+            "status": "ok" if summary is not None else "failed",
+            "courses_processed": len(summary.items()) if summary else 0,
+            **(summary.totals() if summary else dict.fromkeys(("downloaded", "linked", "skipped", "errors"), 0)),
+            "bytes": transferred, "files_by_outcome": outcomes,
+            "seconds": round(time.monotonic() - started, 2),
+        }
+        return result
+
+    try:
+        with ThreadPoolExecutor(max_workers=options["parallel_jobs"], thread_name_prefix="job") as jobs_pool:
+            # Jobs start in file order; the pool then shares the download threads between the running ones
+            results = list(jobs_pool.map(lambda job: run_job(*job), jobs))
+    finally:
+        pool.shutdown()
+        metrics.finish()
+
+    print_batch_report(results, metrics)
+    if base.write_report:
+        write_batch_report(path, results, metrics)
+    return results
+
+def print_batch_report(results, metrics):
+    """Prints one line per job, then the batch totals."""
+    print("\n--- Batch Summary ---")
+    print(f"{'job':<24} {'status':<7} {'courses':>7} {'new':>5} {'linked':>6} {'skipped':>7} {'errors':>6} {'MB':>8} {'secs':>7}")
+    for r in results:
+        print(f"{r['name'][:24]:<24} {r['status']:<7} {r['courses_processed']:>7} {r['downloaded']:>5} {r['linked']:>6} "
+              f"{r['skipped']:>7} {r['errors']:>6} {r['bytes'] / 1e6:>8.1f} {r['seconds']:>7.1f}")
+    failed = sum(1 for r in results if r["status"] != "ok")
+    print(f"\nJobs: {len(results)} ({failed} failed)")
+    for counter in ("downloaded", "linked", "skipped", "errors"):
+        print(f"Total {counter.capitalize()}: {sum(r[counter] for r in results)}")
+    print(f"Transferred {sum(r['bytes'] for r in results) / 1e6:.1f} MB in {metrics.as_dict()['duration_s']:.1f}s")
+    events = metrics.as_dict()["events"]
+    if events:
+        print("Events: " + ", ".join(f"{name} {count}" for name, count in sorted(events.items())))
+
+def write_batch_report(path, results, metrics):
+    """Saves the consolidated report as batch-<timestamp>.json in .lms_runs next to the job file."""
+    report_dir = os.path.join(os.path.dirname(os.path.abspath(path)), ".lms_runs")
+    stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(metrics.started_at))
+    report_path = os.path.join(report_dir, f"batch-{stamp}.json")
+    report = metrics.as_dict()
+    try:
+        os.makedirs(report_dir, exist_ok=True)
+        with open(report_path, "w") as f:
+            json.dump({
+                "job_file": os.path.abspath(path),
+                "started_at": report["started_at"], "finished_at": report["finished_at"],
+                "duration_s": report["duration_s"], "events": report["events"],
+                "totals": {counter: sum(r[counter] for r in results)
+                           for counter in ("downloaded", "linked", "skipped", "errors", "bytes")},
+                "jobs": results,
+            }, f, indent=2)
+        print(f"Batch report saved to {report_path}")
+    except OSError as e:
+        print(f"   Warning: Could not save the batch report: {e}")
@@ -0,0 +1,107 @@
+"""Content-addressed store that keeps each downloaded PDF on disk once."""
+import os
+import shutil
+import threading
+
+class BlobStore:
+    """Content-addressed store of downloaded PDFs, keyed by SHA-256.
+
+    Files in the Term/Course tree are hardlinks into the store, so a reading shared by several
+    courses is kept on disk once. Where hardlinks are not supported (e.g. exFAT/FAT32 drives) or are
+    turned off, the first course copy is the only one: the store just remembers where it is (in a
+    .ref file) and copies it for other courses that need the same file.
+    """
+
+    def __init__(self, root, use_hardlinks=True):
+        self.root = root
+        self.use_hardlinks = use_hardlinks
+        self.lock = threading.Lock()
+
+    def path_for(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256 + ".pdf")
+
+    def _ref_path(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256 + ".ref")
+
+    def source(self, sha256):
+        """Returns the path of a stored copy of the content, or None if there is none."""
+        blob_path = self.path_for(sha256)
+        if os.path.exists(blob_path):
+            return blob_path
+        try:
+            with open(self._ref_path(sha256)) as f:
+                rel_path, size, mtime_ns = f.read().split("\t")
+            path = os.path.normpath(os.path.join(self.root, rel_path))
+            stat = os.stat(path)
+        except (OSError, ValueError):
+            return None
+        # Only trusted while the course copy is the file that was recorded, not an edited or updated one
+        return path if (stat.st_size, stat.st_mtime_ns) == (int(size), int(mtime_ns)) else None
+
+    def has(self, sha256):
+        return self.source(sha256) is not None
+
+    def _remember(self, sha256, path):
+        """Records path as the one copy of the content, for stores without hardlinks."""
+        stat = os.stat(path)
+        ref_path = self._ref_path(sha256)
+        os.makedirs(os.path.dirname(ref_path), exist_ok=True)
+        with open(ref_path + ".tmp", "w") as f:
+            f.write(f"{os.path.relpath(path, self.root)}\t{stat.st_size}\t{stat.st_mtime_ns}")
+        os.replace(ref_path + ".tmp", ref_path)
+
+    def _link(self, src, dst):
+        """Hardlinks src to dst atomically, replacing whatever dst was. Returns False if hardlinks cannot be used."""
+        if not self.use_hardlinks:
+            return False
+        tmp_path = dst + ".link"
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        try:
+            os.link(src, tmp_path)
+        except OSError:
+            return False
+        os.replace(tmp_path, dst)
+        return True
+
+    def _copy(self, src, dst):
+        """Copies src to dst atomically, replacing whatever dst was."""
+        tmp_path = dst + ".link"
+        shutil.copyfile(src, tmp_path)
+        os.replace(tmp_path, dst)
+
+    def ingest(self, src_path, sha256):
+        """Moves a finished download into the store, dropping it if the content is already there."""
+        with self.lock:
+            if self.has(sha256):
+                os.remove(src_path)
+                return
+            blob_path = self.path_for(sha256)
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            os.replace(src_path, blob_path)
+
+    def adopt(self, existing_path, sha256):
+        """Adds a file that is already in the course tree (e.g. from an older run) to the store."""
+        with self.lock:
+            if self.has(sha256):
+                return
+            blob_path = self.path_for(sha256)
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            if not self._link(existing_path, blob_path):
+                self._remember(sha256, existing_path)
+
+    def link_into(self, sha256, filepath):
+        """Places the content at filepath: a hardlink to the stored blob, or else the one copy or a copy of it."""
+        with self.lock:
+            blob_path = self.path_for(sha256)
+            if os.path.exists(blob_path):
+                if self._link(blob_path, filepath):
+                    return
+                # No hardlinks: move the blob into the course folder instead of keeping a second copy
+                os.replace(blob_path, filepath)
+                self._remember(sha256, filepath)
+                return
+            source = self.source(sha256)
+            if source is None:
+                raise FileNotFoundError(f"no stored copy of {sha256}")
+            if os.path.abspath(source) != os.path.abspath(filepath):
+                self._copy(source, filepath)
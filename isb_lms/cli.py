@@ -0,0 +1,179 @@
+"""Command line entry point: python3 -m isb_lms --help"""
+import argparse
+import os
+import sqlite3
+
+from .batch import run_batch
+from .config import Settings
+from .parsing import html_backend
+from .pipeline import run
+from .textindex import TextIndex
+from .utils import parse_size
+from .watch import watch
+
+def build_parser():
+    defaults = Settings()
+    parser = argparse.ArgumentParser(
+        prog="isb_lms",
+        description="Downloads every PDF from your ISB LMS courses, organised by term and course.",
+    )
+    parser.add_argument("-o", "--output-dir", default=defaults.download_dir,
+                        help=f"Folder to download into (default: {defaults.download_dir})")
+    parser.add_argument("--section", action="append", default=[], metavar="TEXT",
+                        help="Only courses in sections containing TEXT, e.g. 'Term 6'. Can be repeated.")
+    parser.add_argument("--course", action="append", default=[], metavar="TEXT",
+                        help="Only courses whose name contains TEXT. Can be repeated.")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Resolve every PDF and list what would be downloaded, without downloading (same as --stop-after resolve)")
+    parser.add_argument("--stop-after", choices=["discover", "resolve", "plan", "download"], default="download",
+                        help="Last stage to run: 'discover' lists the courses, 'resolve' lists the PDFs, "
+                             "'plan' also prints their sizes and the estimated download time")
+    parser.add_argument("--batch", metavar="JOB_FILE",
+                        help="Run every job (session store, filters, output folder) in a JSON job file over one shared "
+                             "worker pool. The other options apply to every job. See isb_lms/batch.py for the format.")
+
+    tuning = parser.add_argument_group("concurrency")
+    tuning.add_argument("-j", "--workers", type=int, default=defaults.download_workers,
+                        help=f"PDFs downloaded in parallel (default: {defaults.download_workers})")
+    tuning.add_argument("--resolve-workers", type=int, default=defaults.resolve_workers,
+                        help=f"Resource pages looked up in parallel (default: {defaults.resolve_workers})")
+    tuning.add_argument("--course-workers", type=int, default=defaults.course_workers,
+                        help=f"Course pages fetched in parallel (default: {defaults.course_workers})")
+    tuning.add_argument("--per-host", type=int, default=defaults.connections_per_host,
+                        help=f"Most requests open against one host (default: {defaults.connections_per_host})")
+    tuning.add_argument("--rate", type=float, default=defaults.requests_per_second,
+                        help=f"Requests per second across all workers (default: {defaults.requests_per_second})")
+    tuning.add_argument("--burst", type=int, default=defaults.rate_limit_burst,
+                        help=f"Requests allowed back-to-back before --rate applies (default: {defaults.rate_limit_burst})")
+    tuning.add_argument("--fixed-concurrency", action="store_true",
+                        help="Keep --per-host and --rate fixed instead of backing off while the server is slow or busy")
+    tuning.add_argument("--attempts", type=int, default=defaults.request_attempts,
+                        help=f"Tries per request when the server is busy or the connection fails (default: {defaults.request_attempts})")
+
+    planning = parser.add_argument_group("plan and disk space")
+    planning.add_argument("--plan", action="store_true",
+                          help="Resolve everything and print sizes and an estimated time per course before downloading")
+    planning.add_argument("--order", choices=["resolved", "smallest", "priority"], default=defaults.download_order,
+                          help="Download order: as resolved (default, starts soonest), smallest first, or --priority courses first")
+    planning.add_argument("--priority", action="append", default=[], metavar="TEXT",
+                          help="With --order priority, courses or sections containing TEXT go first, in the order given. Can be repeated.")
+    planning.add_argument("--disk-budget", type=parse_size, metavar="SIZE",
+                          help="Download at most SIZE this run (e.g. 5G); the rest is left for a later run")
+    planning.add_argument("--min-free", type=parse_size, default=defaults.min_free_space, metavar="SIZE",
+                          help="Always leave SIZE free on the download disk (default: 1G)")
+
+    polling = parser.add_argument_group("watch mode")
+    polling.add_argument("--watch", action="store_true",
+                         help="Keep running and download new materials as they are posted, polling each course page")
+    polling.add_argument("--poll-every", type=float, default=defaults.watch_interval / 60, metavar="MINUTES",
+                         help=f"Starting interval between polls of a course (default: {defaults.watch_interval / 60:g})")
+    polling.add_argument("--poll-min", type=float, default=defaults.watch_min_interval / 60, metavar="MINUTES",
+                         help=f"Shortest interval, for courses that change often (default: {defaults.watch_min_interval / 60:g})")
+    polling.add_argument("--poll-max", type=float, default=defaults.watch_max_interval / 60, metavar="MINUTES",
+                         help=f"Longest interval, for courses that rarely change (default: {defaults.watch_max_interval / 60:g})")
+
+    search = parser.add_argument_group("text index")
+    search.add_argument("--index", action="store_true",
+                        help="Extract the text of every PDF into a searchable index (needs pypdf)")
+    search.add_argument("--index-workers", type=int, default=defaults.index_workers,
+                        help=f"Processes extracting text in parallel (default: {defaults.index_workers})")
+    search.add_argument("--search", metavar="QUERY",
+                        help="Search the text index of --output-dir and exit, e.g. --search 'net present value'")
+    search.add_argument("--no-verify-pdf", action="store_true",
+                        help="Save downloads even when they do not start like a PDF")
+
+    other = parser.add_argument_group("other")
+    other.add_argument("--session-store", default=defaults.session_store,
+                       help=f"Where login cookies are saved (default: {defaults.session_store})")
+    other.add_argument("--login-timeout", type=int, default=defaults.manual_login_timeout,
+                       help=f"Seconds to wait for the manual login (default: {defaults.manual_login_timeout})")
+    other.add_argument("--timeout", type=int, default=defaults.page_timeout,
+                       help=f"Seconds to wait for a page (default: {defaults.page_timeout})")
+    other.add_argument("--download-timeout", type=int, default=defaults.download_timeout,
+                       help=f"Seconds without data before a PDF transfer is abandoned (default: {defaults.download_timeout})")
+    other.add_argument("--parser", choices=["auto", "selectolax", "lxml", "html.parser"], default=defaults.html_parser,
+                       help=f"HTML parser (default: auto, which is {html_backend()} here)")
+    other.add_argument("--browser-pages", action="store_true",
+                       help="Render course pages in Chrome instead of fetching them over HTTP")
+    other.add_argument("--no-hardlinks", action="store_true",
+                       help="Give every course folder its own copy of shared PDFs")
+    other.add_argument("--no-report", action="store_true",
+                       help="Do not save the JSON/CSV run report under <output dir>/.lms_runs")
+    other.add_argument("--metrics-file", metavar="PATH",
+                       help="Also write the run's metrics to PATH in the Prometheus text format")
+    return parser
+
+def settings_from_args(args):
+    return Settings(
+        download_dir=args.output_dir,
+        session_store=args.session_store,
+        manual_login_timeout=args.login_timeout,
+        page_timeout=args.timeout,
+        download_timeout=args.download_timeout,
+        download_workers=args.workers,
+        resolve_workers=args.resolve_workers,
+        course_workers=args.course_workers,
+        connections_per_host=args.per_host,
+        requests_per_second=args.rate,
+        rate_limit_burst=args.burst,
+        adaptive_concurrency=not args.fixed_concurrency,
+        request_attempts=args.attempts,
+        html_parser=args.parser,
+        browser_only_for_login=not args.browser_pages,
+        use_hardlinks=not args.no_hardlinks,
+        verify_pdf=not args.no_verify_pdf,
+        index_text=args.index,
+        index_workers=args.index_workers,
+        plan=args.plan,
+        download_order=args.order,
+        course_priority=args.priority,
+        disk_budget=args.disk_budget,
+        min_free_space=args.min_free,
+        watch_interval=args.poll_every * 60,
+        watch_min_interval=args.poll_min * 60,
+        watch_max_interval=args.poll_max * 60,
+        write_report=not args.no_report,
+        metrics_file=args.metrics_file,
+        sections=args.section,
+        courses=args.course,
+        stop_after="resolve" if args.dry_run and args.stop_after == "download" else args.stop_after,
+    )
+
+def search_index(settings, query):
+    """Prints the indexed PDF pages matching an FTS5 query. Returns the process exit code."""
+    if not os.path.exists(settings.index_path):
+        print(f"No text index at {settings.index_path}. Run with --index first.")
+        return 1
+    index = TextIndex(settings.index_path)
+    try:
+        matches = index.search(query)
+    except sqlite3.OperationalError as e:
+        print(f"Bad search query '{query}': {e}")
+        return 1
+    finally:
+        index.close()
+    if not matches:
+        print(f"No matches for '{query}'.")
+    for course, path, page, snippet in matches:
+        print(f"{course}: {os.path.relpath(path, settings.download_dir)} (page {page})")
+        print(f"    {' '.join(snippet.split())}")
+    return 0
+
+def main(argv=None):
+    """Parses the command line and runs the scraper. Returns the process exit code."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.search:
+        return search_index(settings_from_args(args), args.search)
+    if args.watch:
+        if args.batch or args.dry_run or args.stop_after != "download":
+            parser.error("--watch cannot be combined with --batch, --dry-run or --stop-after")
+        if args.plan or args.order != "resolved" or args.disk_budget is not None:
+            # Each check downloads a handful of new files, so there is nothing to plan; --min-free still applies
+            parser.error("--watch cannot be combined with --plan, --order or --disk-budget")
+        return 0 if watch(settings_from_args(args)) else 1
+    if args.batch:
+        results = run_batch(settings_from_args(args), args.batch)
+        return 0 if results is not None and all(r["status"] == "ok" for r in results) else 1
+    summary = run(settings_from_args(args))
+    return 0 if summary is not None else 1
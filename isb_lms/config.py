@@ -0,0 +1,110 @@
+"""Settings for a scraper run.
+
+The defaults are what the original script hardcoded. The LMS_* environment variables override them
+(e.g. to point the scraper at the offline benchmark server) and the command line overrides both.
+"""
+import os
+from dataclasses import dataclass, field
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/100.0.4896.127 Safari/537.36"
+
+def _env(name, default):
+    return lambda: os.environ.get(name, default)
+
+@dataclass
+class Settings:
+    dashboard_url: str = field(default_factory=_env("LMS_DASHBOARD_URL", "https://elearn.isb.edu/my/"))
+    # On macOS, Desktop is typically under /Users/YourUsername/Desktop
+    download_dir: str = field(default_factory=_env("LMS_DOWNLOAD_DIR", os.path.join(os.path.expanduser('~'), 'Desktop', 'ISB_Coursepacks')))
+    # Login cookies are saved here so later runs can skip Chrome and the manual login while they stay valid
+    session_store: str = field(default_factory=_env("LMS_SESSION_STORE", os.path.join(os.path.expanduser('~'), '.isb_lms_session.json')))
+    session_max_age: int = 8 * 60 * 60 # Seconds to trust cookies that have no expiry of their own (Moodle's session cookie)
+    user_agent: str = DEFAULT_USER_AGENT
+    manual_login_timeout: int = 90 # Seconds to wait for manual login
+    page_timeout: int = 30 # Seconds for dashboard, course and resource page requests
+    download_timeout: int = 120 # Seconds without data before a PDF transfer is abandoned
+
+    download_workers: int = 4 # Number of PDFs downloaded in parallel
+    resolve_workers: int = 8 # Number of filewithwatermark/resource pages looked up in parallel
+    course_workers: int = 4 # Number of course pages fetched in parallel
+    connections_per_host: int = 6 # Never have more than this many requests open against one host
+    requests_per_second: float = 4.0 # Shared rate limit for all requests made through the session
+    rate_limit_burst: int = 4 # Requests that may go out back-to-back before the rate limit applies
+    adaptive_concurrency: bool = True # Lower the per-host limit and rate while the server is slow or pushing back
+    request_attempts: int = 5 # Tries per request on 429/502/503/504 and connection errors
+    backoff_base: float = 1.0 # Seconds; retry n waits a random time up to backoff_base * 2**(n-1)...
+    backoff_max: float = 60.0 # ...but never more than this, unless the server sent a Retry-After
+    max_retry_after: float = 300.0 # Longest Retry-After that is honoured as sent
+    breaker_threshold: int = 5 # Consecutive failures before requests to a host are paused
+    breaker_cooldown: float = 15.0 # Seconds the first pause lasts; it doubles while the host keeps failing
+
+    html_parser: str = "auto" # "auto" picks the fastest installed of "selectolax", "lxml" and "html.parser"
+    browser_only_for_login: bool = True # Fetch dashboard/course pages over HTTP; the browser is only a fallback
+    download_buffer_size: int = 1024 * 1024 # Bytes read from the network and written to disk at a time
+    download_attempts: int = 5 # Tries per file within a run; each retry resumes from what is already on disk
+    use_hardlinks: bool = True # False gives every course folder its own copy (still downloaded only once)
+    verify_pdf: bool = True # Check each download starts like a PDF, so an expired session's login page is caught
+    index_text: bool = False # Extract the text of every PDF into a full-text index (needs pypdf)
+    index_workers: int = 2 # Processes used for text extraction
+    watch_interval: float = 30 * 60 # Watch mode: seconds between polls of a course it knows nothing about yet...
+    watch_min_interval: float = 5 * 60 # ...never polling a course more often than this, however busy it is...
+    watch_max_interval: float = 6 * 60 * 60 # ...or less often than this, however quiet
+    watch_rediscover_interval: float = 6 * 60 * 60 # Seconds between dashboard checks for newly added courses
+    plan: bool = False # Resolve everything and print sizes and an estimated time before downloading
+    download_order: str = "resolved" # resolved (start while still resolving), smallest or priority
+    course_priority: list = field(default_factory=list) # Sections/courses to download first with the priority order
+    disk_budget: int = None # Most bytes one run may download; None for no limit beyond min_free_space
+    min_free_space: int = 1024 ** 3 # Bytes always left free on the download disk
+    write_report: bool = True # Save a JSON and CSV report of every run under <download_dir>/.lms_runs
+    metrics_file: str = None # Also write the run's metrics here in the Prometheus text format
+
+    # Case-insensitive substrings; a course is processed if it matches any of them (empty means everything)
+    sections: list = field(default_factory=list)
+    courses: list = field(default_factory=list)
+    # Last stage to run: "discover" lists the courses, "resolve" lists the PDFs that would be downloaded
+    stop_after: str = "download"
+
+    @property
+    def dry_run(self):
+        """True when nothing is downloaded and the download folder is left alone."""
+        return self.stop_after != "download"
+
+    @property
+    def wants_plan(self):
+        """True if the run needs the plan stage: asked for, or needed to order downloads or keep to a budget."""
+        if self.stop_after == "plan":
+            return True
+        return not self.dry_run and (self.plan or self.download_order != "resolved" or self.disk_budget is not None)
+
+    @property
+    def manifest_path(self):
+        """Records what was downloaded from where, so later runs can use conditional requests and skip unchanged courses."""
+        return os.path.join(self.download_dir, '.lms_manifest.sqlite')
+
+    @property
+    def blob_store_dir(self):
+        """PDFs are stored once here by content hash; the Term/Course folders hold links to them."""
+        return os.path.join(self.download_dir, '.blobs')
+
+    @property
+    def index_path(self):
+        """Full-text index of every downloaded PDF, searchable with --search."""
+        return os.path.join(self.download_dir, '.lms_index.sqlite')
+
+    @property
+    def report_dir(self):
+        return os.path.join(self.download_dir, '.lms_runs')
+
+    @property
+    def pool_size(self):
+        return self.download_workers + self.resolve_workers + self.course_workers
+
+    def wants_course(self, course):
+        """Returns True if the course passes the section and course filters."""
+        section = course["term"].replace('_', ' ').lower()
+        name = course["name"].lower()
+        if self.sections and not any(s.replace('_', ' ').lower() in section for s in self.sections):
+            return False
+        if self.courses and not any(c.lower() in name for c in self.courses):
+            return False
+        return True
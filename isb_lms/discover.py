@@ -0,0 +1,32 @@
+"""Discover stage: finds the courses on the dashboard."""
+from .net import fetch_page
+from .parsing import parse_dashboard_courses
+
+def discover_courses(settings, session, limiter, browser, metrics, dashboard_html=None):
+    """Returns every course on the dashboard. Fetches it over HTTP, with the browser as a fallback.
+
+    dashboard_html can be passed in when the page was already fetched, e.g. to validate the saved session.
+    """
+    print("\nScraping dashboard for course list...")
+    courses = []
+    if settings.browser_only_for_login:
+        if not dashboard_html:
+            with metrics.stage("dashboard"):
+                dashboard_html = fetch_page(session, limiter, settings.dashboard_url,
+                                            timeout=settings.page_timeout, backend=settings.html_parser)
+        if dashboard_html:
+            with metrics.stage("dashboard_parse"):
+                courses = parse_dashboard_courses(dashboard_html, settings.dashboard_url, settings.html_parser)
+    if not courses:
+        if dashboard_html:
+            print("No courses found in the fetched dashboard, retrying with the browser...")
+        with metrics.stage("dashboard_browser"):
+            courses = parse_dashboard_courses(browser.dashboard_html(), settings.dashboard_url, settings.html_parser)
+    return courses
+
+def filter_courses(settings, courses):
+    """Drops the courses that do not match the section and course filters."""
+    selected = [course for course in courses if settings.wants_course(course)]
+    if len(selected) != len(courses):
+        print(f"Section/course filters matched {len(selected)} of {len(courses)} courses.")
+    return selected
@@ -0,0 +1,346 @@
+"""Download stage: resumable, conditional PDF transfers on a worker pool."""
+import hashlib
+import itertools
+import os
+import re
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+
+from .net import RETRYABLE_REQUEST_ERRORS, SessionExpired, is_login_redirect
+from .utils import disk_free, format_size
+
+class IncompleteDownload(Exception):
+    """Raised when a transfer ends before all the bytes the server announced have arrived."""
+
+class NotAPdf(Exception):
+    """Raised when a download turns out not to be a PDF."""
+
+# Transfers cut off mid-body, worth resuming after. Failures to connect at all were already retried
+# by limiter.request, and anything else (404, 403...) fails the file straight away.
+RETRYABLE_DOWNLOAD_ERRORS = (requests.exceptions.ChunkedEncodingError, IncompleteDownload)
+
+def check_pdf_start(first_chunk, response):
+    """Raises unless the first bytes of a response look like a PDF.
+
+    An expired session gets Moodle's login page (HTML) back with a 200, so this is where it shows up.
+    """
+    if b'%PDF-' in first_chunk[:1024]: # The header may follow a few junk bytes, as readers allow
+        return
+    if is_login_redirect(response) or b'/login/index.php' in first_chunk or b'page-login' in first_chunk:
+        raise SessionExpired(f"got the login page instead of {response.url}")
+    content_type = response.headers.get('content-type') or "unknown content"
+    raise NotAPdf(f"server sent {content_type} instead of a PDF")
+
+def transfer_to_part(session, limiter, manifest, pdf_url, part_path, known, settings, stats):
+    """Fetches pdf_url into part_path, resuming from the bytes already there when the server allows it.
+
+    Returns None if the server reports the known copy as unchanged, otherwise (size, sha256, etag, last_modified).
+    Adds the attempt's time to first byte, resume offset and bytes received to the stats dict.
+    """
+    buffer_size = settings.download_buffer_size
+    headers = {}
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    partial = manifest.get_partial(part_path) if offset else None
+    if partial and partial["url"] == pdf_url and (partial["etag"] or partial["last_modified"]):
+        # If-Range makes the server send the whole file instead if it changed since the .part was started
+        headers["Range"] = f"bytes={offset}-"
+        headers["If-Range"] = partial["etag"] or partial["last_modified"]
+    else:
+        offset = 0
+        if known:
+            if known.get("etag"): headers["If-None-Match"] = known["etag"]
+            if known.get("last_modified"): headers["If-Modified-Since"] = known["last_modified"]
+
+    streaming = False
+    try:
+        with limiter.request(session, "GET", pdf_url, stream=True, timeout=settings.download_timeout, headers=headers) as response:
+            streaming = True
+            stats["ttfb_s"] = response.elapsed.total_seconds()
+            if response.status_code == 304:
+                return None
+            if response.status_code == 416:
+                os.remove(part_path) # The saved bytes no longer fit the file; start over on the next attempt
+                raise IncompleteDownload("server rejected the resume range")
+            response.raise_for_status()
+            if settings.verify_pdf and is_login_redirect(response):
+                raise SessionExpired(f"redirected to the login page for {pdf_url}")
+            etag = response.headers.get('etag')
+            last_modified = response.headers.get('last-modified')
+            digest = hashlib.sha256()
+
+            if response.status_code == 206:
+                range_match = re.match(r'bytes (\d+)-\d+/(\d+|\*)', response.headers.get('content-range', ''))
+                if not range_match or int(range_match.group(1)) != offset:
+                    os.remove(part_path)
+                    raise IncompleteDownload("server resumed from an unexpected offset")
+                expected_size = int(range_match.group(2)) if range_match.group(2) != '*' else None
+                stats["resumed_from"] = offset
+                with open(part_path, 'rb') as f:
+                    for block in iter(lambda: f.read(buffer_size), b''):
+                        digest.update(block)
+                mode = 'ab'
+            else:
+                offset = 0
+                content_length = response.headers.get('content-length')
+                # Content-Length counts encoded bytes, so it can only be checked for unencoded bodies
+                expected_size = int(content_length) if content_length and not response.headers.get('content-encoding') else None
+                mode = 'wb'
+
+            chunks = response.iter_content(chunk_size=buffer_size)
+            if mode == 'wb':
+                if settings.verify_pdf:
+                    # Checked before anything is written, so a login page never lands on disk as a .pdf
+                    first_chunk = next(chunks, b'')
+                    check_pdf_start(first_chunk, response)
+                    chunks = itertools.chain([first_chunk], chunks)
+                manifest.record_partial(part_path, pdf_url, etag, last_modified)
+
+            size = offset
+            with open(part_path, mode, buffering=buffer_size) as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+                    stats["bytes"] += len(chunk)
+    except RETRYABLE_REQUEST_ERRORS as err:
+        if not streaming:
+            raise # limiter.request has already retried it
+        raise IncompleteDownload(f"connection lost mid-transfer ({type(err).__name__})") from err
+
+    if expected_size is not None and size != expected_size:
+        raise IncompleteDownload(f"received {size} of {expected_size} bytes")
+    return size, digest.hexdigest(), etag or (partial or {}).get("etag"), last_modified or (partial or {}).get("last_modified")
+
+def download_pdf(session, limiter, manifest, blobs, summary, metrics, settings, browser, course_key, pdf_url, filepath, final_filename, known=None):
+    """Downloads a single PDF into the blob store and links it to filepath. Runs on a download worker thread.
+
+    Bytes go to filepath + '.part', which is resumed with Range requests after a failure (in this run
+    or a later one) and only renamed into place once it is complete. If known (the file's manifest record)
+    is given, the request is made conditional on it so an unchanged file costs a 304 and no body transfer.
+    If the session turns out to have expired, the browser logs in again and the file is retried once.
+    Returns the file's SHA-256, or None if it could not be downloaded.
+    """
+    part_path = filepath + ".part"
+    attempts = settings.download_attempts
+    stats = {"bytes": 0, "ttfb_s": None, "resumed_from": 0, "retries": 0}
+    start = time.monotonic()
+
+    def record(outcome):
+        metrics.record_file(course_key, final_filename, outcome, pdf_url, stats["bytes"], time.monotonic() - start,
+                            stats["ttfb_s"], stats["retries"], stats["resumed_from"])
+        metrics.record_stage("download", time.monotonic() - start)
+
+    if not known:
+        print(f"   Downloading: {final_filename}...")
+    try:
+        attempt = 0
+        relogged_in = False
+        while True:
+            attempt += 1
+            login_generation = browser.login_generation
+            try:
+                result = transfer_to_part(session, limiter, manifest, pdf_url, part_path, known, settings, stats)
+                break
+            except SessionExpired:
+                if relogged_in or not browser.relogin(login_generation):
+                    raise
+                relogged_in = True
+                print(f"   Retrying {final_filename} with the new session...")
+            except RETRYABLE_DOWNLOAD_ERRORS as err:
+                if attempt == attempts:
+                    raise
+                stats["retries"] += 1
+                delay = limiter.retry.delay(attempt)
+                print(f"   Retrying {final_filename} in {delay:.1f}s ({err}), attempt {attempt + 1} of {attempts}...")
+                time.sleep(delay)
+
+        if result is None:
+            print(f"   SKIPPING (unchanged): {final_filename}")
+            summary.record(course_key, "skipped", f"{final_filename} (Skipped)")
+            record("unchanged")
+            sha256 = (known or {}).get("sha256")
+            if sha256:
+                blobs.adopt(filepath, sha256)
+                manifest.record_url_hash(pdf_url, sha256, known["etag"], known["last_modified"], known["size"])
+            return sha256
+        size, sha256, etag, last_modified = result
+        blobs.ingest(part_path, sha256)
+        blobs.link_into(sha256, filepath) # Atomic: the final name only ever holds a complete file
+        manifest.record_file(filepath, pdf_url, etag, last_modified, size, sha256)
+        manifest.record_url_hash(pdf_url, sha256, etag, last_modified, size)
+        manifest.clear_partial(part_path)
+        print(f"   SUCCESS: Saved {final_filename}")
+        summary.record(course_key, "downloaded", f"{final_filename} ({'Updated' if known else 'Downloaded'})")
+        record("updated" if known else "downloaded")
+        return sha256
+
+    except requests.exceptions.Timeout:
+        print(f"   ERROR downloading {final_filename} (Timeout)")
+        summary.record(course_key, "errors", f"{final_filename} (Error: Timeout)")
+        record("error")
+    except (requests.exceptions.RequestException, IncompleteDownload, NotAPdf, SessionExpired) as req_err:
+        print(f"   ERROR downloading {final_filename}: {req_err}")
+        summary.record(course_key, "errors", f"{final_filename} (Error: {req_err})")
+        record("error")
+    except Exception as e:
+        print(f"   ERROR saving {final_filename}: {e}")
+        summary.record(course_key, "errors", f"{final_filename} (Error: {e})")
+        record("error")
+
+# What to do with a resolved PDF. action is None (already handled for this course), "exists" (kept as is),
+# "wait" (its URL is already being downloaded: link to it once it lands), "link" (stored copy),
+# "revalidate" (conditional GET of a file we have) or "download".
+Decision = namedtuple("Decision", "action filepath filename known stored")
+
+def decide(job, manifest, blobs, seen, filepaths, fetching):
+    """Works out what the download stage does with a job. The plan stage asks the same question, so they agree.
+
+    seen holds the (course_key, pdf_url) pairs and filepaths the paths already handled, and are updated here;
+    fetching is the set (or dict) of URLs being downloaded, which the caller adds to for downloads and revalidations.
+    """
+    course_key, course_folder, pdf_url, final_filename = job
+    if not final_filename.lower().endswith('.pdf'): final_filename += ".pdf"
+    filepath = os.path.join(course_folder, final_filename)
+    if (course_key, pdf_url) in seen:
+        return Decision(None, filepath, final_filename, None, None)
+    seen.add((course_key, pdf_url))
+    known = None
+    exists = filepath in filepaths
+    if not exists and os.path.exists(filepath):
+        known = manifest.get_file(filepath)
+        if not known or known["url"] != pdf_url or not (known["etag"] or known["last_modified"]):
+            exists = True # No validators to revalidate with: keep the existing file as before
+    if exists:
+        return Decision("exists", filepath, final_filename, known, None)
+    filepaths.add(filepath) # Guards against two URLs writing the same file at once
+    if pdf_url in fetching:
+        return Decision("wait", filepath, final_filename, known, None)
+    if known:
+        return Decision("revalidate", filepath, final_filename, known, None)
+    stored = manifest.get_url_hash(pdf_url)
+    if stored and blobs.has(stored["sha256"]):
+        return Decision("link", filepath, final_filename, None, stored)
+    return Decision("download", filepath, final_filename, None, None)
+
+class DownloadQueue:
+    """Deduplicates resolved PDFs and hands them to the download worker pool.
+
+    Each URL is fetched at most once per run. Other courses asking for the same URL, in this run or
+    a later one, get a link to the stored copy instead of a second download.
+    """
+
+    def __init__(self, session, limiter, manifest, blobs, summary, metrics, settings, browser, indexer=None, pool=None):
+        self.session = session
+        self.limiter = limiter
+        self.manifest = manifest
+        self.blobs = blobs
+        self.summary = summary
+        self.metrics = metrics
+        self.settings = settings
+        self.browser = browser
+        self.indexer = indexer # Optional TextIndexer fed with every PDF that lands on disk
+        # Batch mode passes its shared pool's lane for this job; anything with submit() and shutdown() works
+        self.pool = pool or ThreadPoolExecutor(max_workers=settings.download_workers, thread_name_prefix="download")
+        self.futures = []
+        self.seen = set() # (course_key, pdf_url) pairs already handled
+        self.queued_filepaths = set() # Guards against two URLs writing the same file at once
+        self.waiting = {} # pdf_url being downloaded -> other (course_key, filepath, filename) wanting it
+        self.queued = 0 # Submitted to the pool but not started yet
+        self.active = 0
+        self.lock = threading.Lock()
+        metrics.watch("download_queued", lambda: self.queued)
+        metrics.watch("download_active", lambda: self.active)
+
+    def enqueue(self, course_key, course_folder, pdf_url, final_filename):
+        """Queues a PDF for download unless it was already seen or already exists on disk.
+
+        Files that exist and have a manifest record for the same URL are queued as conditional requests instead.
+        """
+        with self.lock:
+            decision = decide((course_key, course_folder, pdf_url, final_filename), self.manifest, self.blobs,
+                              self.seen, self.queued_filepaths, self.waiting)
+            action, filepath, final_filename = decision.action, decision.filepath, decision.filename
+            if action == "wait":
+                # Already being fetched for another course: link to it once it lands
+                self.waiting[pdf_url].append((course_key, filepath, final_filename))
+            elif action in ("revalidate", "download"):
+                self.waiting[pdf_url] = []
+                self.queued += 1
+                self.futures.append(self.pool.submit(
+                    self._download, course_key, pdf_url, filepath, final_filename, decision.known
+                ))
+        if action == "exists":
+            print(f"   SKIPPING (exists): {final_filename}")
+            self.summary.record(course_key, "skipped", f"{final_filename} (Skipped)")
+            self.metrics.record_file(course_key, final_filename, "exists", pdf_url)
+        elif action == "link":
+            self._link(course_key, pdf_url, filepath, final_filename, decision.stored)
+
+    def _download(self, course_key, pdf_url, filepath, final_filename, known):
+        sha256 = None
+        with self.lock:
+            self.queued -= 1
+            self.active += 1
+        try:
+            free = disk_free(self.settings.download_dir)
+            if free < self.settings.min_free_space:
+                # Last line of defence when sizes were not planned, or the disk filled up from elsewhere
+                print(f"   SKIPPING (only {format_size(free)} of disk space left): {final_filename}")
+                self.summary.record(course_key, "skipped", f"{final_filename} (Skipped: low disk space)")
+                self.metrics.record_file(course_key, final_filename, "no_space", pdf_url)
+                return
+            sha256 = download_pdf(
+                self.session, self.limiter, self.manifest, self.blobs, self.summary, self.metrics, self.settings,
+                self.browser, course_key, pdf_url, filepath, final_filename, known
+            )
+            if sha256:
+                self._index(sha256, filepath, course_key)
+        finally:
+            with self.lock:
+                self.active -= 1
+                waiters = self.waiting.pop(pdf_url, [])
+            stored = self.manifest.get_url_hash(pdf_url) if sha256 else None
+            for waiter_course_key, waiter_filepath, waiter_filename in waiters:
+                if stored:
+                    self._link(waiter_course_key, pdf_url, waiter_filepath, waiter_filename, stored)
+                else:
+                    print(f"   ERROR downloading {waiter_filename}: shared download failed")
+                    self.summary.record(waiter_course_key, "errors", f"{waiter_filename} (Error: shared download failed)")
+                    self.metrics.record_file(waiter_course_key, waiter_filename, "error", pdf_url)
+
+    def _link(self, course_key, pdf_url, filepath, final_filename, stored):
+        """Places an already-downloaded PDF at filepath without fetching it again."""
+        try:
+            self.blobs.link_into(stored["sha256"], filepath)
+            self.manifest.record_file(
+                filepath, pdf_url, stored["etag"], stored["last_modified"], stored["size"], stored["sha256"]
+            )
+            print(f"   LINKED (already downloaded): {final_filename}")
+            self.summary.record(course_key, "linked", f"{final_filename} (Linked)")
+            self.metrics.record_file(course_key, final_filename, "linked", pdf_url)
+            self._index(stored["sha256"], filepath, course_key)
+        except OSError as e:
+            print(f"   ERROR linking {final_filename}: {e}")
+            self.summary.record(course_key, "errors", f"{final_filename} (Error: {e})")
+            self.metrics.record_file(course_key, final_filename, "error", pdf_url)
+
+    def _index(self, sha256, filepath, course_key):
+        source = self.blobs.source(sha256) if self.indexer else None
+        if source:
+            self.indexer.add(sha256, source, filepath, course_key)
+
+    def join(self):
+        """Blocks until every queued download has finished."""
+        with self.lock:
+            futures = list(self.futures)
+        remaining = sum(1 for f in futures if not f.done())
+        if remaining:
+            print(f"\nWaiting for {remaining} queued downloads to finish...")
+        wait(futures)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,166 @@
+"""SQLite manifest of downloaded files, course page fingerprints and resolved resource pages."""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+class Manifest:
+    """SQLite record of downloaded files, course page fingerprints and resolved resource pages."""
+
+    def __init__(self, path, base_dir, in_memory=False):
+        """With in_memory, works on a copy of the manifest at path (if there is one) and never writes to it."""
+        self.base_dir = base_dir
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(":memory:" if in_memory else path, check_same_thread=False)
+        if in_memory and os.path.exists(path):
+            source = sqlite3.connect(Path(path).resolve().as_uri() + "?mode=ro", uri=True)
+            try:
+                source.backup(self.conn)
+            finally:
+                source.close()
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY, url TEXT, etag TEXT, last_modified TEXT,
+                size INTEGER, sha256 TEXT, updated_at REAL);
+            CREATE TABLE IF NOT EXISTS courses (
+                url TEXT PRIMARY KEY, fingerprint TEXT, updated_at REAL);
+            CREATE TABLE IF NOT EXISTS resolutions (
+                resource_url TEXT PRIMARY KEY, pdf_url TEXT, filename TEXT, updated_at REAL);
+            CREATE TABLE IF NOT EXISTS url_hashes (
+                url TEXT PRIMARY KEY, sha256 TEXT, etag TEXT, last_modified TEXT, size INTEGER, updated_at REAL);
+            CREATE TABLE IF NOT EXISTS partials (
+                path TEXT PRIMARY KEY, url TEXT, etag TEXT, last_modified TEXT, updated_at REAL);
+            CREATE TABLE IF NOT EXISTS course_links (
+                course_url TEXT, href TEXT, link_text TEXT, PRIMARY KEY (course_url, href, link_text));
+            CREATE TABLE IF NOT EXISTS course_polls (
+                url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, interval_s REAL, checked_at REAL, changed_at REAL);
+        """)
+        self.conn.commit()
+
+    def _key(self, filepath):
+        # Paths are stored relative to the download folder so the folder can be moved
+        return os.path.relpath(filepath, self.base_dir)
+
+    def get_file(self, filepath):
+        """Returns the stored record for a downloaded file as a dict, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT url, etag, last_modified, size, sha256 FROM files WHERE path = ?", (self._key(filepath),)
+            ).fetchone()
+        if not row:
+            return None
+        return dict(zip(("url", "etag", "last_modified", "size", "sha256"), row))
+
+    def record_file(self, filepath, url, etag, last_modified, size, sha256):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (self._key(filepath), url, etag, last_modified, size, sha256, time.time()),
+            )
+            self.conn.commit()
+
+    def get_url_hash(self, url):
+        """Returns the content hash and validators last downloaded from a URL, in any course or run."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT sha256, etag, last_modified, size FROM url_hashes WHERE url = ?", (url,)
+            ).fetchone()
+        return dict(zip(("sha256", "etag", "last_modified", "size"), row)) if row else None
+
+    def record_url_hash(self, url, sha256, etag, last_modified, size):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO url_hashes VALUES (?, ?, ?, ?, ?, ?)",
+                (url, sha256, etag, last_modified, size, time.time()),
+            )
+            self.conn.commit()
+
+    def get_partial(self, part_path):
+        """Returns the URL and validators a .part file was started with, so it can be resumed safely."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT url, etag, last_modified FROM partials WHERE path = ?", (self._key(part_path),)
+            ).fetchone()
+        return dict(zip(("url", "etag", "last_modified"), row)) if row else None
+
+    def record_partial(self, part_path, url, etag, last_modified):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO partials VALUES (?, ?, ?, ?, ?)",
+                (self._key(part_path), url, etag, last_modified, time.time()),
+            )
+            self.conn.commit()
+
+    def clear_partial(self, part_path):
+        with self.lock:
+            self.conn.execute("DELETE FROM partials WHERE path = ?", (self._key(part_path),))
+            self.conn.commit()
+
+    def course_fingerprint(self, course_url):
+        with self.lock:
+            row = self.conn.execute("SELECT fingerprint FROM courses WHERE url = ?", (course_url,)).fetchone()
+        return row[0] if row else None
+
+    def set_course_fingerprint(self, course_url, fingerprint):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO courses VALUES (?, ?, ?)", (course_url, fingerprint, time.time()))
+            self.conn.commit()
+
+    def course_links(self, course_url):
+        """Returns the set of (href, link_text) pairs last seen on a course page."""
+        with self.lock:
+            rows = self.conn.execute("SELECT href, link_text FROM course_links WHERE course_url = ?", (course_url,)).fetchall()
+        return set(rows)
+
+    def set_course_links(self, course_url, potential_resources):
+        with self.lock:
+            self.conn.execute("DELETE FROM course_links WHERE course_url = ?", (course_url,))
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO course_links VALUES (?, ?, ?)",
+                ((course_url, href, link_text) for href, link_text in potential_resources),
+            )
+            self.conn.commit()
+
+    def get_course_poll(self, course_url):
+        """Returns the watch mode's polling state for a course as a dict, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT etag, last_modified, interval_s, checked_at, changed_at FROM course_polls WHERE url = ?", (course_url,)
+            ).fetchone()
+        return dict(zip(("etag", "last_modified", "interval_s", "checked_at", "changed_at"), row)) if row else None
+
+    def record_course_poll(self, course_url, etag, last_modified, interval_s, checked_at, changed_at):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO course_polls VALUES (?, ?, ?, ?, ?, ?)",
+                (course_url, etag, last_modified, interval_s, checked_at, changed_at),
+            )
+            self.conn.commit()
+
+    def get_resolution(self, resource_url):
+        """Returns (pdf_url, filename) previously resolved for a resource page, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT pdf_url, filename FROM resolutions WHERE resource_url = ?", (resource_url,)
+            ).fetchone()
+        return row
+
+    def record_resolution(self, resource_url, pdf_url, filename):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO resolutions VALUES (?, ?, ?, ?)", (resource_url, pdf_url, filename, time.time())
+            )
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+def course_fingerprint(potential_resources):
+    """Hashes the set of resource links on a course page; it changes whenever a link is added, removed or renamed."""
+    digest = hashlib.sha256()
+    for href, link_text in sorted(set(potential_resources)):
+        digest.update(f"{href}\t{link_text}\n".encode('utf-8'))
+    return digest.hexdigest()
@@ -0,0 +1,228 @@
+"""Run instrumentation: stage timings, per-file transfer stats, event counts and sampled gauges.
+
+A RunMetrics is shared by every stage of a run. At the end it is written as a JSON report and a
+per-file CSV under the download folder's .lms_runs/ directory, and optionally as a Prometheus
+text file for a node_exporter textfile collector or similar.
+"""
+import csv
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+FILE_FIELDS = ("course", "filename", "outcome", "bytes", "seconds", "ttfb_s", "retries", "resumed_from", "url")
+
+class RunMetrics:
+    """Thread-safe collector for one run's timings and counters."""
+
+    def __init__(self, sample_interval=0.5):
+        self.started_at = time.time()
+        self.started = time.monotonic()
+        self.finished_at = None
+        self.lock = threading.Lock()
+        self.stages = {} # name -> {"count", "total_s", "max_s"}
+        self.files = []
+        self.counters = {} # name -> count, e.g. retries and throttling events
+        self.gauges = {} # name -> callable returning the current value
+        self.samples = [] # (seconds since start, {gauge name: value})
+        self.sample_interval = sample_interval
+        self.sampler = None
+        self.stop_sampling = threading.Event()
+
+    # --- Recording ---
+
+    def record_stage(self, name, seconds):
+        with self.lock:
+            stage = self.stages.setdefault(name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            stage["count"] += 1
+            stage["total_s"] += seconds
+            stage["max_s"] = max(stage["max_s"], seconds)
+
+    @contextmanager
+    def stage(self, name):
+        """Times the block and adds it to the stage's totals, even if it raises."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record_stage(name, time.monotonic() - start)
+
+    def record_file(self, course, filename, outcome, url, size=0, seconds=0.0, ttfb_s=None, retries=0, resumed_from=0):
+        """Records what happened to one file: downloaded, updated, unchanged, linked, exists, no_space or error."""
+        row = {"course": course, "filename": filename, "outcome": outcome, "bytes": size,
+               "seconds": round(seconds, 4), "ttfb_s": round(ttfb_s, 4) if ttfb_s is not None else None,
+               "retries": retries, "resumed_from": resumed_from, "url": url}
+        with self.lock:
+            self.files.append(row)
+
+    def count(self, name, n=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def watch(self, name, gauge):
+        """Samples gauge() (e.g. a queue depth) every sample_interval seconds while the run is going."""
+        with self.lock:
+            self.gauges[name] = gauge
+        if self.sampler is None:
+            self.sampler = threading.Thread(target=self._sample_loop, name="metrics-sampler", daemon=True)
+            self.sampler.start()
+
+    def _sample_loop(self):
+        while not self.stop_sampling.wait(self.sample_interval):
+            self.sample()
+
+    def sample(self):
+        with self.lock:
+            gauges = dict(self.gauges)
+        values = {}
+        for name, gauge in gauges.items():
+            try:
+                values[name] = gauge()
+            except Exception:
+                pass # A gauge whose stage has already shut down
+        with self.lock:
+            self.samples.append((round(time.monotonic() - self.started, 2), values))
+
+    def finish(self):
+        """Stops the sampler and fixes the run's end time. Safe to call more than once."""
+        if self.finished_at is None:
+            self.stop_sampling.set()
+            if self.sampler:
+                self.sampler.join()
+            self.sample() # Depths at the very end, so short runs still have one sample
+            self.finished_at = time.time()
+            self.record_stage("run", time.monotonic() - self.started)
+
+    # --- Reporting ---
+
+    def gauge_stats(self):
+        """Returns {gauge name: {"max", "mean"}} over the samples taken."""
+        stats = {}
+        with self.lock:
+            samples = list(self.samples)
+        for _, values in samples:
+            for name, value in values.items():
+                entry = stats.setdefault(name, {"max": 0, "sum": 0, "n": 0})
+                entry["max"] = max(entry["max"], value)
+                entry["sum"] += value
+                entry["n"] += 1
+        return {name: {"max": e["max"], "mean": round(e["sum"] / e["n"], 2)} for name, e in stats.items()}
+
+    def file_totals(self):
+        """Returns per-outcome file counts and the bytes transferred."""
+        outcomes = {}
+        transferred = 0
+        with self.lock:
+            for row in self.files:
+                outcomes[row["outcome"]] = outcomes.get(row["outcome"], 0) + 1
+                transferred += row["bytes"]
+        return outcomes, transferred
+
+    def as_dict(self, summary=None, settings=None):
+        outcomes, transferred = self.file_totals()
+        duration = (self.finished_at or time.time()) - self.started_at
+        with self.lock:
+            stages = {name: dict(stage, total_s=round(stage["total_s"], 3), max_s=round(stage["max_s"], 3),
+                                 mean_s=round(stage["total_s"] / stage["count"], 3))
+                      for name, stage in sorted(self.stages.items())}
+            files = list(self.files)
+            samples = list(self.samples)
+            counters = dict(self.counters)
+        report = {
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "duration_s": round(duration, 3),
+            "bytes_transferred": transferred,
+            "mb_per_s": round(transferred / duration / 1e6, 3) if duration else None,
+            "files_by_outcome": outcomes,
+            "stages": stages,
+            "events": counters,
+            "gauges": self.gauge_stats(),
+            "gauge_samples": samples,
+            "files": files,
+        }
+        if summary is not None:
+            report["totals"] = summary.totals()
+            report["courses"] = {key: {c: status[c] for c in summary.COUNTERS} for key, status in summary.items()}
+        if settings is not None:
+            report["settings"] = {
+                "dashboard_url": settings.dashboard_url, "download_dir": settings.download_dir,
+                "download_workers": settings.download_workers, "resolve_workers": settings.resolve_workers,
+                "course_workers": settings.course_workers, "connections_per_host": settings.connections_per_host,
+                "requests_per_second": settings.requests_per_second, "html_parser": settings.html_parser,
+                "sections": settings.sections, "courses": settings.courses,
+            }
+        return report
+
+    def write_json(self, path, summary=None, settings=None):
+        with open(path, "w") as f:
+            json.dump(self.as_dict(summary, settings), f, indent=2)
+
+    def write_csv(self, path):
+        """Writes one row per file."""
+        with self.lock:
+            files = list(self.files)
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=FILE_FIELDS)
+            writer.writeheader()
+            writer.writerows(files)
+
+    def write_prometheus(self, path):
+        """Writes the run's totals in the Prometheus text format, as node_exporter's textfile collector reads it.
+
+        Counters are declared under their _total names, and OpenMetrics-only lines (# UNIT, # EOF) are left out.
+        """
+        outcomes, transferred = self.file_totals()
+        with self.lock:
+            stages = sorted(self.stages.items())
+        lines = [
+            "# TYPE lms_stage_seconds summary",
+            "# HELP lms_stage_seconds Time spent in each stage of the last run.",
+        ]
+        for name, stage in stages:
+            lines.append(f'lms_stage_seconds_count{{stage="{name}"}} {stage["count"]}')
+            lines.append(f'lms_stage_seconds_sum{{stage="{name}"}} {stage["total_s"]:.6f}')
+        lines += ["# TYPE lms_files_total counter", "# HELP lms_files_total Files handled in the last run, by outcome."]
+        for outcome, count in sorted(outcomes.items()):
+            lines.append(f'lms_files_total{{outcome="{outcome}"}} {count}')
+        lines += ["# TYPE lms_transferred_bytes_total counter",
+                  "# HELP lms_transferred_bytes_total PDF bytes received in the last run.",
+                  f"lms_transferred_bytes_total {transferred}"]
+        with self.lock:
+            counters = sorted(self.counters.items())
+        lines += ["# TYPE lms_events_total counter", "# HELP lms_events_total Retries, throttling and circuit breaker events in the last run."]
+        for name, count in counters:
+            lines.append(f'lms_events_total{{event="{name}"}} {count}')
+        lines += ["# TYPE lms_gauge_max gauge", "# HELP lms_gauge_max Highest value of each sampled gauge (queue depths, limits) in the last run."]
+        for name, stats in sorted(self.gauge_stats().items()):
+            lines.append(f'lms_gauge_max{{gauge="{name}"}} {stats["max"]}')
+        lines += ["# TYPE lms_last_run_timestamp_seconds gauge",
+                  "# HELP lms_last_run_timestamp_seconds When the last run finished.",
+                  f"lms_last_run_timestamp_seconds {self.finished_at or time.time():.3f}"]
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path) # Collectors may read the file at any moment
+
+    def write_reports(self, report_dir, summary=None, settings=None):
+        """Writes <timestamp>.json and <timestamp>.csv into report_dir. Returns the JSON report's path."""
+        os.makedirs(report_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        json_path = os.path.join(report_dir, f"run-{stamp}.json")
+        self.write_json(json_path, summary, settings)
+        self.write_csv(os.path.join(report_dir, f"run-{stamp}.csv"))
+        return json_path
+
+def print_timings(metrics):
+    """Prints where the run's time went."""
+    report = metrics.as_dict()
+    print("\n--- Timing ---")
+    print(f"{'stage':<16} {'count':>6} {'total s':>9} {'mean s':>8} {'max s':>8}")
+    for name, stage in report["stages"].items():
+        print(f"{name:<16} {stage['count']:>6} {stage['total_s']:>9.2f} {stage['mean_s']:>8.3f} {stage['max_s']:>8.3f}")
+    print(f"Transferred {report['bytes_transferred'] / 1e6:.1f} MB at {report['mb_per_s'] or 0:.2f} MB/s")
+    for name, stats in report["gauges"].items():
+        print(f"{name}: max {stats['max']}, mean {stats['mean']}")
+    if report["events"]:
+        print("Events: " + ", ".join(f"{name} {count}" for name, count in sorted(report["events"].items())))
@@ -0,0 +1,397 @@
+"""HTTP session, request pacing and page fetching."""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .parsing import LOGGED_IN_SELECTOR, html_has
+
+# Responses worth retrying: the server is overloaded (429/503) or a proxy in front of it is (502/504)
+RETRY_STATUSES = {429, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+RETRYABLE_REQUEST_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+# Failures while reading a response body that say the host (not the local disk) is struggling
+BODY_ERRORS = RETRYABLE_REQUEST_ERRORS + (requests.exceptions.ChunkedEncodingError,)
+
+class SessionExpired(Exception):
+    """Raised when the LMS answers with its login page instead of the content, i.e. the session has lapsed."""
+
+def is_login_redirect(response):
+    return '/login/' in urlparse(response.url).path
+
+def parse_retry_after(value):
+    """Returns the seconds a Retry-After header asks for (delay-seconds or HTTP-date form), or None."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+class RetryPolicy:
+    """Exponential backoff with full jitter. A Retry-After from the server takes precedence."""
+
+    def __init__(self, attempts=5, base_delay=1.0, max_delay=60.0, max_retry_after=300.0):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_retry_after = max_retry_after
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait after the given (1-based) failed attempt."""
+        if retry_after is not None:
+            # A little jitter so workers told the same Retry-After do not all come back at once
+            return min(retry_after, self.max_retry_after) + random.uniform(0, 1)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+class TokenBucket:
+    """Thread-safe token bucket used to pace requests instead of fixed sleeps.
+
+    throttle() halves the rate when the server pushes back; recover() creeps it back up to the
+    configured rate as requests succeed again.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.max_rate = rate
+        self.min_rate = min(rate, 0.5)
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.last_throttle = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available, then takes it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.rate
+            time.sleep(wait_time)
+
+    def throttle(self):
+        """Halves the rate, at most once a second so a burst of 429s counts as one signal. Returns True if it changed."""
+        with self.lock:
+            now = time.monotonic()
+            if now - self.last_throttle < 1.0 or self.rate <= self.min_rate:
+                return False
+            self.last_throttle = now
+            self.rate = max(self.min_rate, self.rate / 2)
+            return True
+
+    def recover(self):
+        with self.lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.02)
+
+class AdaptiveLimit:
+    """Concurrency limit for one host, adjusted additive-increase/multiplicative-decrease.
+
+    The limit grows by one after a full window of healthy responses and halves when the host
+    throttles, fails, or its latency climbs well above the best seen recently.
+    """
+
+    LATENCY_FACTOR = 2.0 # Latency this many times the best seen counts as the host struggling...
+    MIN_LATENCY_RISE = 0.25 # ...as long as it is also this many seconds slower, so fast pages do not flap
+    DECREASE_INTERVAL = 2.0 # Seconds between decreases, so one bad moment only halves the limit once
+
+    def __init__(self, max_limit, adaptive=True):
+        self.max_limit = max(1, max_limit)
+        self.limit = self.max_limit
+        self.adaptive = adaptive
+        self.in_use = 0
+        self.successes = 0
+        self.latency = None # Exponentially weighted average time to response headers
+        self.best_latency = None
+        self.last_decrease = 0.0
+        self.cond = threading.Condition()
+
+    def acquire(self):
+        with self.cond:
+            while self.in_use >= self.limit:
+                self.cond.wait()
+            self.in_use += 1
+
+    def release(self):
+        with self.cond:
+            self.in_use -= 1
+            self.cond.notify()
+
+    def on_success(self, latency):
+        if not self.adaptive:
+            return
+        with self.cond:
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            # The best latency drifts up slowly so a host that settles at a new normal is not punished forever
+            self.best_latency = self.latency if self.best_latency is None else min(self.best_latency * 1.005, self.latency)
+            if (self.latency > self.LATENCY_FACTOR * self.best_latency
+                    and self.latency - self.best_latency > self.MIN_LATENCY_RISE):
+                self._decrease()
+                return
+            self.successes += 1
+            if self.successes >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self.successes = 0
+                self.cond.notify()
+
+    def on_overload(self):
+        if not self.adaptive:
+            return
+        with self.cond:
+            self._decrease()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self.last_decrease < self.DECREASE_INTERVAL:
+            return
+        self.last_decrease = now
+        self.successes = 0
+        self.limit = max(1, self.limit // 2)
+
+class CircuitBreaker:
+    """Stops sending requests to a host that keeps failing.
+
+    After threshold consecutive failures the breaker opens and requests wait out a cooldown. Then a
+    single probe is let through: success closes the breaker, failure reopens it for twice as long.
+    Requests wait rather than fail so a long sync still finishes in one pass.
+    """
+
+    def __init__(self, host, threshold=5, cooldown=15.0, max_cooldown=300.0):
+        self.host = host
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+        self.cond = threading.Condition()
+
+    def before_request(self):
+        """Blocks while the breaker is open. In the half-open state only one caller gets through."""
+        with self.cond:
+            while True:
+                if self.state == "closed":
+                    return
+                now = time.monotonic()
+                if self.state == "open" and now >= self.open_until:
+                    self.state = "half-open"
+                    self.probing = False
+                if self.state == "half-open" and not self.probing:
+                    self.probing = True
+                    return
+                self.cond.wait(self.open_until - now if self.state == "open" else 1.0)
+
+    def record_success(self):
+        with self.cond:
+            self.failures = 0
+            if self.state != "closed":
+                print(f"   {self.host} is responding again, resuming requests.")
+                self.state = "closed"
+                self.cooldown = self.base_cooldown
+                self.cond.notify_all()
+
+    def release_probe(self):
+        """Gives up the half-open probe without a verdict on the host."""
+        with self.cond:
+            if self.state == "half-open":
+                self.probing = False
+                self.cond.notify_all()
+
+    def record_failure(self):
+        """Returns True if this failure opened the breaker."""
+        with self.cond:
+            self.failures += 1
+            if self.state == "half-open":
+                self.cooldown = min(self.max_cooldown, self.cooldown * 2)
+            elif self.state == "open" or self.failures < self.threshold:
+                return False
+            self.state = "open"
+            self.probing = False
+            self.open_until = time.monotonic() + self.cooldown
+            print(f"   Warning: {self.host} keeps failing, pausing requests to it for {self.cooldown:.0f}s...")
+            self.cond.notify_all()
+            return True
+
+class HostState:
+    """The adaptive concurrency limit and circuit breaker for one host."""
+
+    def __init__(self, host, per_host, adaptive, breaker_threshold, breaker_cooldown):
+        self.limit = AdaptiveLimit(per_host, adaptive)
+        self.breaker = CircuitBreaker(host, breaker_threshold, breaker_cooldown)
+
+    def on_success(self, latency):
+        self.breaker.record_success()
+        self.limit.on_success(latency)
+
+    def on_failure(self):
+        self.limit.on_overload()
+        return self.breaker.record_failure()
+
+class HostLimiter:
+    """Paces all requests through one token bucket and gives each host its own concurrency limit and circuit breaker.
+
+    request() also retries throttled (429/503), gateway (502/504) and connection failures with backoff.
+    """
+
+    def __init__(self, per_host, rate, burst, retry=None, adaptive=True, breaker_threshold=5, breaker_cooldown=15.0,
+                 metrics=None):
+        self.per_host = per_host
+        self.bucket = TokenBucket(rate, burst)
+        self.retry = retry or RetryPolicy()
+        self.adaptive = adaptive
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.metrics = metrics
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def host(self, url):
+        name = urlparse(url).netloc
+        with self.lock:
+            state = self.hosts.get(name)
+            if state is None:
+                state = self.hosts[name] = HostState(
+                    name, self.per_host, self.adaptive, self.breaker_threshold, self.breaker_cooldown
+                )
+        return state
+
+    def concurrency_limit(self):
+        """Sum of the hosts' current concurrency limits."""
+        with self.lock:
+            return sum(state.limit.limit for state in self.hosts.values())
+
+    def _count(self, event):
+        if self.metrics:
+            self.metrics.count(event)
+
+    def _failed(self, host, throttled=False):
+        if host.on_failure():
+            self._count("breaker_open")
+        if throttled and self.bucket.throttle():
+            self._count("throttled")
+            print(f"   Warning: Server asked us to slow down, now pacing at {self.bucket.rate:.2f} requests/s.")
+
+    @contextmanager
+    def request(self, session, method, url, **kwargs):
+        """Sends a request and yields the response, holding the host slot until the block ends.
+
+        Retryable failures are retried with backoff until the policy's attempts run out; after that
+        connection errors are raised and a final 429/5xx response is yielded for the caller to handle.
+        """
+        host = self.host(url)
+        for attempt in range(1, self.retry.attempts + 1):
+            host.breaker.before_request()
+            host.limit.acquire()
+            try:
+                self.bucket.acquire()
+                try:
+                    response = session.request(method, url, **kwargs)
+                except RETRYABLE_REQUEST_ERRORS as err:
+                    self._failed(host)
+                    if attempt == self.retry.attempts:
+                        raise
+                    delay = self.retry.delay(attempt)
+                    print(f"   Retrying {url} in {delay:.1f}s ({type(err).__name__}), attempt {attempt + 1} of {self.retry.attempts}...")
+                except BaseException:
+                    host.breaker.release_probe() # Not the host's fault (e.g. a bad URL); let another request probe
+                    raise
+                else:
+                    status = response.status_code
+                    if status in RETRY_STATUSES:
+                        self._failed(host, throttled=status in THROTTLE_STATUSES)
+                    else:
+                        host.on_success(response.elapsed.total_seconds())
+                        self.bucket.recover()
+                    if status not in RETRY_STATUSES or attempt == self.retry.attempts:
+                        with response:
+                            try:
+                                yield response
+                            except BODY_ERRORS:
+                                self._failed(host)
+                                raise
+                        return
+                    response.close()
+                    delay = self.retry.delay(attempt, parse_retry_after(response.headers.get('retry-after')))
+                    print(f"   Retrying {url} in {delay:.1f}s (HTTP {status}), attempt {attempt + 1} of {self.retry.attempts}...")
+            finally:
+                host.limit.release()
+            self._count("retry")
+            time.sleep(delay) # Outside the slot, so other requests to the host can use it meanwhile
+
+def create_limiter(settings, metrics=None):
+    """Creates the HostLimiter described by the settings."""
+    retry = RetryPolicy(settings.request_attempts, settings.backoff_base, settings.backoff_max, settings.max_retry_after)
+    return HostLimiter(settings.connections_per_host, settings.requests_per_second, settings.rate_limit_burst, retry,
+                       settings.adaptive_concurrency, settings.breaker_threshold, settings.breaker_cooldown, metrics)
+
+def create_session(user_agent, pool_size):
+    """Creates a requests session whose connection pool is large enough for all workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": user_agent})
+    return session
+
+def add_cookies(session, cookies, verbose=True):
+    """Adds Selenium-style cookie dicts to the requests session."""
+    for cookie in cookies:
+        try:
+            session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain') or '', path=cookie.get('path', '/'))
+        except Exception as cookie_err:
+            if verbose:
+                print(f"   Warning: Skipping cookie '{cookie.get('name')}': {cookie_err}")
+
+def fetch_page(session, limiter, url, required_selector=LOGGED_IN_SELECTOR, timeout=30, backend="auto"):
+    """Fetches a page with the HTTP session. Returns None if it is not usable without the browser."""
+    try:
+        with limiter.request(session, "GET", url, allow_redirects=True, timeout=timeout) as response:
+            response.raise_for_status()
+            html = response.text
+    except requests.exceptions.RequestException as req_err:
+        print(f"   Warning: Could not fetch {url} over HTTP: {req_err}")
+        return None
+    if is_login_redirect(response):
+        print(f"   Warning: Session was not accepted for {url} (redirected to login).")
+        return None
+    if not html_has(html, required_selector, backend):
+        return None
+    return html
+
+def fetch_page_if_changed(session, limiter, url, etag=None, last_modified=None, timeout=30):
+    """Conditional GET of a page. Returns (html, etag, last_modified), with html None if the server says it is unchanged.
+
+    Raises SessionExpired if the session was not accepted, and RequestException if the page could not be fetched.
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    with limiter.request(session, "GET", url, headers=headers, allow_redirects=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            return None, etag, last_modified
+        response.raise_for_status()
+        html = response.text
+    if is_login_redirect(response):
+        raise SessionExpired(f"redirected to the login page for {url}")
+    return html, response.headers.get('etag'), response.headers.get('last-modified')
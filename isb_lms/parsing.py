@@ -0,0 +1,180 @@
+"""HTML parsing for the dashboard, course and resource pages.
+
+selectolax handles the pages that only need CSS selectors; lxml is used as BeautifulSoup's tree
+builder for the dashboard, which needs sibling navigation. Both are optional.
+"""
+import re
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from .utils import sanitize_filename
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser as SelectolaxParser # selectolax < 1.0
+    except ImportError:
+        SelectolaxParser = None
+try:
+    import lxml # noqa: F401
+    BS4_TREE_BUILDER = 'lxml'
+except ImportError:
+    BS4_TREE_BUILDER = 'html.parser'
+
+COURSE_RESOURCE_SELECTOR = (
+    'li.modtype_filewithwatermark .activityinstance > a.aalink, '
+    'li.modtype_resource .activityinstance > a.aalink, '
+    'a[href*=".pdf"]'
+)
+RESOURCE_PDF_SELECTOR = (
+    'div.resourceworkaround a[href*=".pdf"], a.realworkaround[href*=".pdf"], '
+    'div.resourcecontent a[href*=".pdf"], object[data*=".pdf"], embed[src*=".pdf"], '
+    'div#region-main a[href*=".pdf"]'
+)
+# Present on a rendered Moodle course page; used to tell a real course page from a login page or JS shell
+COURSE_CONTENT_SELECTOR = "div.course-content, ul.topics, ul.weeks"
+LOGGED_IN_SELECTOR = "div#region-main, div.usermenu, nav#primary-nav, a[href*='login/logout.php']"
+# Course activities all sit inside <li> elements; keeping only those (and stray PDF <a>s) skips the
+# page chrome, scripts and navigation that make up most of a Moodle page
+COURSE_STRAINER = SoupStrainer(['li', 'a'])
+# Everything the resource-page selectors look for lives under the main region
+RESOURCE_STRAINER = SoupStrainer(id='region-main')
+
+def html_backend(preference="auto"):
+    """Returns the parser backend a preference resolves to with the libraries that are installed."""
+    if preference == "html.parser":
+        return "html.parser"
+    if SelectolaxParser and preference in ("auto", "selectolax"):
+        return "selectolax"
+    return BS4_TREE_BUILDER
+
+def make_soup(html, parse_only=None, backend="auto"):
+    """Parses html with BeautifulSoup, using lxml as the tree builder when it is available."""
+    builder = 'html.parser' if html_backend(backend) == 'html.parser' else BS4_TREE_BUILDER
+    return BeautifulSoup(html, builder, parse_only=parse_only)
+
+def html_has(html, selector, backend="auto"):
+    """Returns True if anything in html matches the CSS selector."""
+    if html_backend(backend) == "selectolax":
+        return SelectolaxParser(html).css_first(selector) is not None
+    return make_soup(html, backend=backend).select_one(selector) is not None
+
+def extract_course_links(course_html, backend="auto"):
+    """Returns (href, link_text) for every PDF link and filewithwatermark/resource activity on a course page."""
+    links = []
+    if html_backend(backend) == "selectolax":
+        for node in SelectolaxParser(course_html).css(COURSE_RESOURCE_SELECTOR):
+            href = node.attributes.get('href')
+            name_node = node.css_first('span.instancename')
+            link_text = (name_node or node).text(strip=True)
+            if href: links.append((href, link_text))
+        return links
+    course_soup = make_soup(course_html, COURSE_STRAINER, backend)
+    for link in course_soup.select(COURSE_RESOURCE_SELECTOR):
+        href = link.get('href')
+        link_text_element = link.find('span', class_='instancename')
+        link_text = link_text_element.get_text(strip=True) if link_text_element else link.get_text(strip=True)
+        if href: links.append((href, link_text))
+    return links
+
+def extract_resource_pdf_href(resource_html, backend="auto"):
+    """Returns the PDF URL (possibly relative) linked or embedded on a resource page.
+
+    Returns None when no PDF element is found, and "" when one is found but has no URL.
+    """
+    if html_backend(backend) == "selectolax":
+        node = SelectolaxParser(resource_html).css_first(RESOURCE_PDF_SELECTOR)
+        if node is None: return None
+        attributes = node.attributes
+        return attributes.get('href') or attributes.get('data') or attributes.get('src') or ""
+    element = make_soup(resource_html, RESOURCE_STRAINER, backend).select_one(RESOURCE_PDF_SELECTOR)
+    if element is None:
+        element = make_soup(resource_html, backend=backend).select_one(RESOURCE_PDF_SELECTOR) # Page without a main region
+    if element is None: return None
+    return element.get('href') or element.get('data') or element.get('src') or ""
+
+def parse_dashboard_courses(dashboard_html, dashboard_url, backend="auto"):
+    """Finds the courses on the dashboard, grouped by their Term/Block Week section."""
+    courses = []
+    soup = make_soup(dashboard_html, backend=backend)
+
+    # --- Identify Term and Block Week Sections ---
+    # Updated regex to find headers containing 'Term X' OR 'Block Week Y' (case-insensitive)
+    section_header_pattern = re.compile(
+        r'(Term\s+\d+|Block\s*Week[\s\d]*)',
+        re.IGNORECASE
+    )
+    # Find elements likely to be section headers
+    possible_headers = soup.find_all(
+        ['h2', 'h3', 'h4', 'div', 'span'],
+        string=section_header_pattern
+    )
+
+    if not possible_headers:
+         print("WARNING: Could not find specific Term/Block Week headers. Trying fallback course link search.")
+         course_links = soup.select('div.coursebox > div.info > h3.coursename > a, a.coursename[href*="/course/view.php"]')
+         if not course_links:
+             print("ERROR: Could not find any course links on dashboard.")
+             return courses
+         print(f"Found {len(course_links)} potential courses (fallback).")
+         processed_urls = set()
+         for link in course_links:
+             course_name = link.get_text(strip=True)
+             course_url = link.get('href')
+             if course_name and course_url:
+                  abs_url = urljoin(dashboard_url, course_url)
+                  if abs_url not in processed_urls:
+                     processed_urls.add(abs_url)
+                     section_folder_name = "Unknown_Section" # Use generic section name
+                     courses.append({"term": section_folder_name, "name": sanitize_filename(course_name), "url": abs_url})
+                     print(f"  Found Course (fallback): {course_name}")
+
+    else:
+         print(f"Found {len(possible_headers)} potential Term/Block Week sections.")
+         processed_urls = set()
+         for header_el in possible_headers:
+             header_text = header_el.get_text(strip=True)
+             match = section_header_pattern.search(header_text)
+             if match:
+                 section_name_raw = match.group(1).strip()
+                 section_folder_name = sanitize_filename(section_name_raw).replace(' ', '_')
+             else:
+                 section_folder_name = sanitize_filename(header_text).replace(' ', '_')
+                 if not section_folder_name: section_folder_name = "Unnamed_Section"
+
+             print(f" Processing Section: {section_folder_name} (from '{header_text}')")
+
+             # Find the container holding the course links
+             container = header_el.find_next_sibling(['ul', 'div'])
+             if not container: # If not immediate sibling, check siblings further down
+                  current_el = header_el
+                  while True:
+                       next_s = current_el.find_next_sibling()
+                       if not next_s or next_s.name in ['h2','h3','h4']: break
+                       if next_s.name in ['ul','div']: container = next_s; break
+                       current_el = next_s
+             if not container: container = header_el.parent # Fallback: check parent
+
+             if container:
+                 links = container.select('a[href*="/course/view.php?id="]')
+                 found_in_section = 0
+                 for link in links:
+                     course_name = link.get_text(strip=True)
+                     course_url = link.get('href')
+                     abs_course_url = urljoin(dashboard_url, course_url)
+                     if course_name and course_url and abs_course_url not in processed_urls:
+                          print(f"  Found Course: {course_name}")
+                          courses.append({
+                              "term": section_folder_name, # Use extracted section name
+                              "name": sanitize_filename(course_name),
+                              "url": abs_course_url
+                          })
+                          processed_urls.add(abs_course_url)
+                          found_in_section +=1
+                 if found_in_section == 0:
+                      print(f"  No course links found directly within the identified container for '{section_folder_name}'.")
+             else:
+                  print(f"  Warning: Could not find a likely container for course links under section '{section_folder_name}'.")
+    return courses
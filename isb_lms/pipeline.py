@@ -0,0 +1,179 @@
+"""Runs the discover, resolve, download and report stages for one set of settings."""
+import os
+
+from .auth import Browser, load_session_store
+from .blobstore import BlobStore
+from .discover import discover_courses, filter_courses
+from .download import DownloadQueue
+from .manifest import Manifest
+from .metrics import RunMetrics, print_timings
+from .plan import plan_downloads
+from .net import add_cookies, create_limiter, create_session, fetch_page
+from .report import DownloadSummary, print_report
+from .resolve import Resolver
+from .textindex import TextIndex, TextIndexer, pypdf
+from .utils import ensure_dir_exists
+
+def login(settings, session, limiter, browser, metrics):
+    """Authenticates the session, reusing saved cookies when they still work.
+
+    Returns the dashboard HTML if checking the saved session already fetched it, otherwise None.
+    Runs under the browser's login lock, so a batch job waiting on another job's login of the same
+    account picks up the session it saved instead of asking for a second login.
+    """
+    with browser.logging_in():
+        # One request to the dashboard both validates the saved cookies and gives us the course list
+        saved_cookies = load_session_store(settings.session_store)
+        if saved_cookies:
+            print("\nFound a saved login session, checking it is still valid...")
+            add_cookies(session, saved_cookies)
+            with metrics.stage("session_check"):
+                dashboard_html = fetch_page(session, limiter, settings.dashboard_url,
+                                            timeout=settings.page_timeout, backend=settings.html_parser)
+            if dashboard_html:
+                print("Saved session is valid. Skipping browser login.")
+                return dashboard_html
+            print("Saved session is no longer valid. A fresh login is needed.")
+            session.cookies.clear()
+        browser.ensure()
+        return None
+
+def list_jobs(jobs):
+    """Dry-run download stage: prints what would be downloaded. Returns the number of PDFs."""
+    count = 0
+    for job in jobs:
+        filename = job.filename if job.filename.lower().endswith('.pdf') else job.filename + ".pdf"
+        exists = os.path.exists(os.path.join(job.course_folder, filename))
+        print(f"   WOULD DOWNLOAD: {job.course_key} / {filename}{' (exists)' if exists else ''}")
+        count += 1
+    return count
+
+def write_run_reports(settings, metrics, summary):
+    """Saves the run's JSON/CSV report and Prometheus metrics file, as configured. Returns the JSON report's path, if any."""
+    json_path = None
+    try:
+        if settings.write_report and not settings.dry_run:
+            json_path = metrics.write_reports(settings.report_dir, summary, settings)
+            print(f"Run report saved to {json_path} (and .csv)")
+        if settings.metrics_file:
+            metrics.write_prometheus(settings.metrics_file)
+            print(f"Metrics saved to {settings.metrics_file}")
+    except OSError as e:
+        print(f"   Warning: Could not save the run report: {e}")
+    return json_path
+
+def resolve_and_download(settings, session, limiter, browser, manifest, summary, metrics, courses,
+                         download_pool=None, pages=None, new_links_only=False):
+    """Resolve and download stages for the given courses; the results end up in summary and metrics.
+
+    Watch mode passes the course pages it already fetched, and only wants links that are new since last time.
+    """
+    downloads = None
+    index = None
+    indexer = None
+    jobs = None
+    try:
+        resolver = Resolver(settings, session, limiter, browser, manifest, summary, metrics, new_links_only)
+        jobs = resolver.jobs(courses, pages)
+        blobs = BlobStore(settings.blob_store_dir, settings.use_hardlinks)
+        to_download = jobs
+        if settings.wants_plan:
+            print("\n--- Resolving PDFs for the plan ---")
+            with metrics.stage("resolve"):
+                resolved = list(jobs)
+            to_download = plan_downloads(settings, session, limiter, manifest, blobs, metrics, resolved)
+            if settings.stop_after == "plan":
+                return
+        if settings.dry_run:
+            print("\n--- Resolving PDFs (dry run) ---")
+            with metrics.stage("resolve"):
+                print(f"\nWould download {list_jobs(jobs)} PDFs.")
+            return
+        print("\n--- Starting PDF Downloads ---")
+        if settings.index_text:
+            if pypdf is None:
+                print("Warning: --index needs pypdf (pip3 install pypdf). Skipping the text index.")
+            else:
+                index = TextIndex(settings.index_path)
+                indexer = TextIndexer(index, settings.index_workers, metrics)
+        downloads = DownloadQueue(session, limiter, manifest, blobs, summary, metrics, settings, browser, indexer,
+                                  download_pool)
+        # Jobs arrive while later courses are still resolving; enqueueing never blocks on the network
+        with metrics.stage("resolve"):
+            for job in to_download:
+                downloads.enqueue(*job)
+        with metrics.stage("download_drain"):
+            downloads.join()
+        if indexer:
+            with metrics.stage("index_drain"):
+                indexer.join()
+    finally:
+        if jobs:
+            jobs.close() # Stops the resolvers if the download stage ended early
+        if downloads:
+            downloads.shutdown()
+        if indexer:
+            indexer.shutdown()
+        if index:
+            index.close()
+
+def run(settings, limiter=None, metrics=None, download_pool=None, login_lock=None):
+    """Logs in, finds the selected courses and downloads their PDFs.
+
+    Batch mode passes in the limiter, download pool and login lock its jobs share, and a metrics
+    object it reads afterwards; a single run creates its own.
+    Returns the DownloadSummary, or None if the run could not get as far as the course list.
+    """
+    print("Starting LMS PDF Downloader...")
+    print(f"Downloads will be saved to: {settings.download_dir}")
+    if not settings.dry_run:
+        ensure_dir_exists(settings.download_dir)
+
+    session = create_session(settings.user_agent, pool_size=settings.pool_size)
+    metrics = metrics or RunMetrics()
+    limiter = limiter or create_limiter(settings, metrics)
+    metrics.watch("concurrency_limit", limiter.concurrency_limit)
+    metrics.watch("requests_per_second", lambda: round(limiter.bucket.rate, 2))
+    browser = Browser(settings, session, limiter, metrics, login_lock)
+    summary = DownloadSummary()
+    manifest = None
+    courses = []
+
+    try:
+        # --- Discover ---
+        try:
+            with metrics.stage("discover"):
+                dashboard_html = login(settings, session, limiter, browser, metrics)
+                # From here on the browser is only a fallback; pages are fetched with the pooled session
+                courses = discover_courses(settings, session, limiter, browser, metrics, dashboard_html)
+        except Exception as e:
+            print(f"\nError scraping dashboard: {e}")
+            return None
+        if not courses:
+            print("\nERROR: No courses found to process after checking dashboard.")
+            return None
+        print(f"\nFound {len(courses)} unique courses across all sections.")
+        courses = filter_courses(settings, courses)
+        if settings.stop_after == "discover":
+            for course in courses:
+                print(f"  {course['term']} - {course['name']}: {course['url']}")
+            return summary
+
+        # --- Resolve and Download ---
+        # A dry run reads a copy of the manifest so the download folder is left as it was
+        manifest = Manifest(settings.manifest_path, settings.download_dir, in_memory=settings.dry_run)
+        resolve_and_download(settings, session, limiter, browser, manifest, summary, metrics, courses, download_pool)
+        return summary
+
+    finally:
+        # --- Cleanup ---
+        if manifest:
+            manifest.close()
+        browser.quit()
+        metrics.finish()
+        # --- Final Report ---
+        if settings.stop_after != "discover":
+            print_report(summary, len(courses), settings.download_dir)
+            print_timings(metrics)
+        write_run_reports(settings, metrics, summary)
+        print("\nScript finished.")
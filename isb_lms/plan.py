@@ -0,0 +1,182 @@
+"""Plan stage: sizes up a run before downloading, orders it and keeps it within the disk budget.
+
+Everything is resolved first, then the PDFs that would really be transferred get a HEAD request
+(on the resolve pool's worth of threads, through the shared limiter) for their Content-Length.
+The plan is printed per section and course with an estimated time based on the speed of the last
+run, and downloads that would take the disk past the budget are left for a later run.
+"""
+import glob
+import json
+import os
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .download import decide
+from .utils import disk_free, format_size
+
+# status is one of: download, link (same file already stored), exists (kept as is) or revalidate (conditional GET)
+PlannedFile = namedtuple("PlannedFile", "job status size")
+
+PLAN_COUNTS = ("download", "link", "exists", "revalidate", "bytes", "unknown")
+
+def head_size(session, limiter, url, timeout):
+    """Returns the Content-Length a HEAD request reports for a PDF, or None if it does not say."""
+    try:
+        with limiter.request(session, "HEAD", url, allow_redirects=True, timeout=timeout) as response:
+            pass
+    except requests.exceptions.RequestException as e:
+        print(f"   Warning: Could not get the size of {url}: {e}")
+        return None
+    length = response.headers.get('content-length')
+    if not response.ok or not length or 'pdf' not in response.headers.get('content-type', '').lower():
+        return None
+    return int(length)
+
+def classify(jobs, manifest, blobs):
+    """Works out what the download stage would do with each job, with the same decide() DownloadQueue.enqueue uses."""
+    planned = []
+    seen = set()
+    filepaths = set()
+    fetching = set()
+    for job in jobs:
+        action = decide(job, manifest, blobs, seen, filepaths, fetching).action
+        if action is None:
+            continue
+        if action in ("revalidate", "download"):
+            fetching.add(job.pdf_url)
+        status = "link" if action == "wait" else action # Either way it is linked to a copy downloaded once
+        planned.append(PlannedFile(job, status, None if status == "download" else 0))
+    return planned
+
+def measure_sizes(settings, session, limiter, planned):
+    """Fills in the size of every file that would be downloaded, with concurrent HEAD requests."""
+    to_size = [i for i, item in enumerate(planned) if item.status == "download"]
+    print(f"\nChecking the size of {len(to_size)} PDFs...")
+    with ThreadPoolExecutor(max_workers=settings.resolve_workers, thread_name_prefix="plan") as pool:
+        sizes = pool.map(lambda i: head_size(session, limiter, planned[i].job.pdf_url, settings.page_timeout), to_size)
+        for i, size in zip(to_size, sizes):
+            planned[i] = planned[i]._replace(size=size)
+    return planned
+
+def last_bandwidth(settings):
+    """Bytes per second this run should download at, judging by the most recent run that downloaded anything, or None.
+
+    The whole-run average would include logging in and resolving, so this takes the speed of the
+    individual transfers instead and multiplies it by how many run at once.
+    """
+    for path in sorted(glob.glob(os.path.join(settings.report_dir, "run-*.json")), reverse=True):
+        try:
+            with open(path) as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            continue
+        rows = [row for row in report.get("files", []) if row.get("outcome") in ("downloaded", "updated")]
+        size = sum(row["bytes"] for row in rows)
+        seconds = sum(row["seconds"] for row in rows)
+        if size and seconds:
+            return size / seconds * min(settings.download_workers, settings.connections_per_host)
+    return None
+
+def priority_rank(settings, job):
+    """Position of the first --priority text in the course's section or name; courses matching none go last."""
+    course = job.course_key.replace('_', ' ').lower()
+    for rank, text in enumerate(settings.course_priority):
+        if text.replace('_', ' ').lower() in course:
+            return rank
+    return len(settings.course_priority)
+
+def order_plan(settings, planned):
+    """Orders the plan as configured: as resolved, smallest first, or by course priority (smallest first within)."""
+    if settings.download_order == "resolved":
+        return planned
+    size_key = lambda item: (item.status == "download", item.size is None, item.size or 0)
+    if settings.download_order == "smallest":
+        return sorted(planned, key=size_key)
+    return sorted(planned, key=lambda item: (priority_rank(settings, item.job),) + size_key(item))
+
+def apply_budget(settings, planned):
+    """Splits the ordered plan into what fits the disk budget and what is left for a later run.
+
+    Files of unknown size are counted at the average known size. Files that only link or revalidate
+    cost no space and always go ahead, unless they would link to a download that was left out.
+    """
+    budget = disk_free(settings.download_dir) - settings.min_free_space
+    if settings.disk_budget is not None:
+        budget = min(budget, settings.disk_budget)
+    known = [item.size for item in planned if item.status == "download" and item.size is not None]
+    average = sum(known) / len(known) if known else 0
+    used = 0
+    deferred_urls = set()
+    for item in planned:
+        if item.status == "download":
+            size = item.size if item.size is not None else average
+            if deferred_urls or used + size > budget:
+                deferred_urls.add(item.job.pdf_url)
+            else:
+                used += size
+    kept, deferred = [], []
+    for item in planned:
+        if item.status in ("download", "link") and item.job.pdf_url in deferred_urls:
+            deferred.append(item)
+        else:
+            kept.append(item)
+    return kept, deferred, budget
+
+def print_plan(settings, planned, deferred, budget, bandwidth):
+    """Prints what the run will do per section and course, the totals and an estimated time."""
+    print("\n--- Download Plan ---")
+    sections = {}
+    for item in planned:
+        section = os.path.basename(os.path.dirname(item.job.course_folder))
+        course = os.path.basename(item.job.course_folder)
+        counts = sections.setdefault(section, {}).setdefault(course, dict.fromkeys(PLAN_COUNTS, 0))
+        counts[item.status] += 1
+        if item.status == "download":
+            counts["bytes"] += item.size or 0
+            counts["unknown"] += item.size is None
+    totals = dict.fromkeys(PLAN_COUNTS, 0)
+    for section, courses in sorted(sections.items()):
+        section_files = sum(c["download"] for c in courses.values())
+        section_bytes = sum(c["bytes"] for c in courses.values())
+        print(f"\n{section}: {section_files} to download ({format_size(section_bytes)})")
+        for course, counts in sorted(courses.items()):
+            print(f"  {course}: {counts['download']} to download ({format_size(counts['bytes'])}), "
+                  f"{counts['link']} linked, {counts['exists']} kept, {counts['revalidate']} checked for updates")
+            for key in totals:
+                totals[key] += counts[key]
+
+    print("\n--- Plan Totals ---")
+    print(f"To download: {totals['download']} PDFs, {format_size(totals['bytes'])}"
+          + (f" (+ {totals['unknown']} of unknown size)" if totals['unknown'] else ""))
+    print(f"Linked to a copy downloaded once: {totals['link']}")
+    print(f"Already there: {totals['exists']} kept, {totals['revalidate']} checked for updates")
+    kept_bytes = totals['bytes'] - sum(item.size or 0 for item in deferred if item.status == "download")
+    if bandwidth:
+        seconds = kept_bytes / bandwidth
+        print(f"Estimated download time: {seconds / 60:.1f} minutes at {bandwidth / 1e6:.2f} MB/s (speed of the last run)")
+    else:
+        print("Estimated download time: unknown until a run has downloaded something")
+    print(f"Free space under {settings.download_dir}: {format_size(disk_free(settings.download_dir))}, "
+          f"budget for this run: {format_size(max(budget, 0))}")
+    if deferred:
+        deferred_bytes = sum(item.size or 0 for item in deferred if item.status == "download")
+        print(f"Disk budget reached: {len(deferred)} PDFs ({format_size(deferred_bytes)}) are left for a later run:")
+        for item in deferred:
+            filename = item.job.filename if item.job.filename.lower().endswith('.pdf') else item.job.filename + ".pdf"
+            path = os.path.relpath(os.path.join(item.job.course_folder, filename), settings.download_dir)
+            size = "linked" if item.status == "link" else format_size(item.size) if item.size is not None else "size unknown"
+            print(f"  - {path} ({size})")
+
+def plan_downloads(settings, session, limiter, manifest, blobs, metrics, jobs):
+    """Runs the plan stage over the resolved jobs. Returns the jobs to download, in order."""
+    planned = classify(jobs, manifest, blobs)
+    with metrics.stage("plan"):
+        planned = measure_sizes(settings, session, limiter, planned)
+    planned = order_plan(settings, planned)
+    kept, deferred, budget = apply_budget(settings, planned)
+    print_plan(settings, planned, deferred, budget, last_bandwidth(settings))
+    if deferred:
+        metrics.count("deferred_for_disk_space", len(deferred))
+    return [item.job for item in kept]
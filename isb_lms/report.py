@@ -0,0 +1,60 @@
+"""Per-course download counters and the summary printed at the end of a run."""
+import threading
+
+class DownloadSummary:
+    """Per-course counters, shared by all worker threads."""
+
+    COUNTERS = ("downloaded", "linked", "skipped", "errors")
+
+    def __init__(self):
+        self.courses = {}
+        self.lock = threading.Lock()
+
+    def add_course(self, course_key):
+        with self.lock:
+            self.courses.setdefault(course_key, {**{counter: 0 for counter in self.COUNTERS}, "files": []})
+
+    def record(self, course_key, counter, file_status=None):
+        """Updates the summary for a course. Safe to call from worker threads."""
+        with self.lock:
+            status = self.courses[course_key]
+            status[counter] += 1
+            if file_status:
+                status["files"].append(file_status)
+
+    def items(self):
+        """Returns (course_key, counters) sorted by course key (Section Name - Course Name)."""
+        with self.lock:
+            return sorted((key, dict(status, files=list(status["files"]))) for key, status in self.courses.items())
+
+    def totals(self):
+        totals = dict.fromkeys(self.COUNTERS, 0)
+        for _, status in self.items():
+            for counter in self.COUNTERS:
+                totals[counter] += status[counter]
+        return totals
+
+def print_report(summary, courses_found, download_dir):
+    """Prints each course's counters and files, then the overall totals."""
+    print("\n--- Download Summary ---")
+    items = summary.items()
+    for course_id, status in items:
+        print(f"\nCourse: {course_id}") # course_id includes section name
+        print(f"  Downloaded: {status['downloaded']}")
+        print(f"  Linked:     {status['linked']}")
+        print(f"  Skipped:    {status['skipped']}")
+        print(f"  Errors:     {status['errors']}")
+        if status['files']:
+             print("  Files Processed:")
+             for file_status in sorted(status['files']):
+                  print(f"   - {file_status}")
+
+    totals = summary.totals()
+    print("\n--- Overall Totals ---")
+    print(f"Courses Found: {courses_found}")
+    print(f"Courses Processed (attempted): {len(items)}")
+    print(f"Total PDFs Downloaded: {totals['downloaded']}")
+    print(f"Total PDFs Linked (same file already downloaded): {totals['linked']}")
+    print(f"Total PDFs Skipped (already existed): {totals['skipped']}")
+    print(f"Total Errors (pages/downloads): {totals['errors']}")
+    print(f"\nDownloads attempted in: {download_dir}")
@@ -0,0 +1,246 @@
+"""Resolve stage: turns course pages into a stream of PDFs to download."""
+import os
+import queue
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urljoin
+
+import requests
+
+from .manifest import course_fingerprint
+from .net import SessionExpired, fetch_page, is_login_redirect
+from .parsing import COURSE_CONTENT_SELECTOR, extract_course_links, extract_resource_pdf_href
+from .utils import ensure_dir_exists, filename_from_disposition, filename_from_pdf_url, sanitize_filename
+
+DownloadJob = namedtuple("DownloadJob", "course_key course_folder pdf_url filename")
+
+_DONE = object() # Put on the job queue once every course and resource page has been handled
+
+class Resolver:
+    """Fetches course pages and resolves their resource pages into DownloadJobs.
+
+    Course pages and resource pages are worked on by thread pools. jobs() yields each PDF as soon as
+    it is known, so the download stage can start while later courses are still being resolved.
+    With new_links_only (watch mode), only links that were not on the course page last time are emitted,
+    and the course's links are left for the caller to record once their downloads have succeeded.
+    """
+
+    def __init__(self, settings, session, limiter, browser, manifest, summary, metrics, new_links_only=False):
+        self.settings = settings
+        self.session = session
+        self.limiter = limiter
+        self.browser = browser
+        self.manifest = manifest
+        self.summary = summary
+        self.metrics = metrics
+        self.new_links_only = new_links_only
+        # Module types ('filewithwatermark', 'resource') whose pages turned out to be HTML on a HEAD request.
+        # Further lookups for those types go straight to GET instead of paying for a wasted HEAD.
+        self.head_not_useful = set()
+        self.stopped = threading.Event()
+        self.resolving = 0 # Resource pages submitted but not resolved yet
+        self.lock = threading.Lock()
+
+    def jobs(self, courses, pages=None):
+        """Yields a DownloadJob for every PDF in the courses, in the order they are resolved.
+
+        pages maps course URLs to course page HTML the caller already has, which is used instead of fetching it again.
+        """
+        pages = pages or {}
+        found = queue.Queue()
+        resolve_pool = ThreadPoolExecutor(max_workers=self.settings.resolve_workers, thread_name_prefix="resolve")
+        pending_resolutions = []
+        self.metrics.watch("resolve_pending", lambda: self.resolving)
+        self.metrics.watch("jobs_waiting", found.qsize)
+
+        def produce():
+            try:
+                course_workers = self.settings.course_workers if self.settings.browser_only_for_login else 1
+                with ThreadPoolExecutor(max_workers=course_workers, thread_name_prefix="course") as course_pool:
+                    list(course_pool.map(
+                        lambda course: self.process_course(course, resolve_pool, pending_resolutions, found.put,
+                                                           pages.get(course["url"])),
+                        courses
+                    ))
+                if pending_resolutions:
+                    print(f"\nWaiting for {sum(1 for f in pending_resolutions if not f.done())} resource pages to resolve...")
+                    wait(pending_resolutions)
+            finally:
+                found.put(_DONE)
+
+        producer = threading.Thread(target=produce, name="resolve-courses", daemon=True)
+        producer.start()
+        try:
+            while True:
+                job = found.get()
+                if job is _DONE:
+                    break
+                yield job
+        finally:
+            # Also reached when the consumer stops early: let in-flight pages finish but start no new ones
+            self.stopped.set()
+            resolve_pool.shutdown(wait=True, cancel_futures=True)
+            producer.join() # So nothing uses the manifest once the caller closes it
+
+    def process_course(self, course, resolve_pool, pending_resolutions, emit, course_page_html=None):
+        """Fetches one course page, emits its direct PDFs and submits its resource pages for resolving."""
+        if self.stopped.is_set():
+            return
+        section_name = course["term"] # This holds "Term_X" or "Block_Week_Y" etc.
+        course_name = course["name"]
+        course_url = course["url"]
+        print(f"\nProcessing Course: {course_name} (Section: {section_name})")
+        print(f" URL: {course_url}")
+
+        course_folder = os.path.join(self.settings.download_dir, section_name, course_name)
+        if not self.settings.dry_run:
+            try:
+                 ensure_dir_exists(course_folder)
+            except Exception as dir_err:
+                 print(f"   ERROR: Cannot create/access course folder '{course_folder}'. Skipping course. Error: {dir_err}")
+                 return
+
+        course_key = f"{section_name} - {course_name}"
+        self.summary.add_course(course_key)
+
+        try:
+            if not course_page_html and self.settings.browser_only_for_login:
+                with self.metrics.stage("course_page"):
+                    course_page_html = fetch_page(self.session, self.limiter, course_url, COURSE_CONTENT_SELECTOR,
+                                                  self.settings.page_timeout, self.settings.html_parser)
+            if not course_page_html:
+                # Page needs JavaScript (or the session was rejected): render it in the browser
+                print(f"   Navigating to course page in browser...")
+                course_page_html = self.browser.page_html(course_url)
+            # Find potential resources
+            resource_links = extract_course_links(course_page_html, self.settings.html_parser)
+            potential_links = resource_links
+
+            if not resource_links:
+                print(f"   No potential PDF links or resource pages found in {course_name}.")
+                return
+
+            print(f"   Found {len(resource_links)} potential links/resources in {course_name}. Checking...")
+
+            # Resource pages only need resolving again if the course page's links changed
+            fingerprint = course_fingerprint(resource_links)
+            previous_fingerprint = self.manifest.course_fingerprint(course_url)
+            course_unchanged = previous_fingerprint == fingerprint
+            if self.new_links_only and previous_fingerprint:
+                if course_unchanged:
+                    print(f"   No new or changed links in {course_name}.")
+                    return
+                seen_links = self.manifest.course_links(course_url)
+                if seen_links:
+                    resource_links = [link for link in resource_links if link not in seen_links]
+                print(f"   {len(resource_links)} new or changed links in {course_name}.")
+            if course_unchanged:
+                print(f"   Course links unchanged since last run, reusing resolved resource pages.")
+            elif not self.settings.dry_run and not self.new_links_only:
+                self.manifest.set_course_links(course_url, potential_links)
+                self.manifest.set_course_fingerprint(course_url, fingerprint)
+
+            for href, link_text in resource_links:
+                try: # Wrap individual link processing
+                    # Case 1: Direct link
+                    if href.lower().endswith(".pdf"):
+                        pdf_url_to_download = urljoin(course_url, href)
+                        final_filename = filename_from_pdf_url(pdf_url_to_download, sanitize_filename(link_text))
+                        print(f"   + Direct PDF link found: {link_text}")
+                        emit(DownloadJob(course_key, course_folder, pdf_url_to_download, final_filename))
+
+                    # Case 2: Intermediate page, resolved in the background
+                    elif '/mod/filewithwatermark/view.php' in href or '/mod/resource/view.php' in href:
+                        resource_url = urljoin(course_url, href)
+                        cached = self.manifest.get_resolution(resource_url) if course_unchanged else None
+                        if cached:
+                            emit(DownloadJob(course_key, course_folder, cached[0], cached[1]))
+                            continue
+                        print(f"   ? Investigating resource: {link_text} ({resource_url})")
+                        with self.lock:
+                            self.resolving += 1
+                        pending_resolutions.append(resolve_pool.submit(
+                            self.resolve_and_emit, emit, course_key, course_folder, resource_url, link_text
+                        ))
+                except Exception as inner_err:
+                     print(f"   UNEXPECTED ERROR processing link '{link_text}': {inner_err}")
+                     self.summary.record(course_key, "errors")
+            # End loop through links
+
+        except Exception as e:
+            print(f"   MAJOR ERROR processing course {course_name}: {e}")
+            self.summary.record(course_key, "errors")
+
+    def resolve_resource(self, resource_url, link_text):
+        """Finds the PDF behind a filewithwatermark/resource page. Returns (pdf_url, filename) or (None, None)."""
+        session, limiter, timeout = self.session, self.limiter, self.settings.page_timeout
+        base_filename_from_link = sanitize_filename(link_text)
+        module_type = 'filewithwatermark' if '/mod/filewithwatermark/' in resource_url else 'resource'
+
+        # HEAD first: when the page just redirects to the PDF this avoids transferring any body
+        if module_type not in self.head_not_useful:
+            with limiter.request(session, "HEAD", resource_url, allow_redirects=True, timeout=timeout) as head:
+                pass
+            if head.ok and 'application/pdf' in head.headers.get('content-type', '').lower():
+                print(f"     -> Resource page redirected directly to PDF: {link_text}")
+                final_filename = filename_from_disposition(head.headers.get('content-disposition', ''))
+                return head.url, final_filename or filename_from_pdf_url(head.url, base_filename_from_link)
+            self.head_not_useful.add(module_type)
+
+        with limiter.request(session, "GET", resource_url, allow_redirects=True, timeout=timeout) as res_page:
+            res_page.raise_for_status()
+            if is_login_redirect(res_page):
+                raise SessionExpired(f"redirected to the login page for {resource_url}")
+            res_page_html = res_page.text
+        content_type = res_page.headers.get('content-type', '').lower()
+
+        if 'application/pdf' in content_type:
+            print(f"     -> Resource page redirected directly to PDF: {link_text}")
+            final_filename = filename_from_disposition(res_page.headers.get('content-disposition', ''))
+            return res_page.url, final_filename or filename_from_pdf_url(res_page.url, base_filename_from_link)
+
+        pdf_href = extract_resource_pdf_href(res_page_html, self.settings.html_parser)
+        if pdf_href is None:
+            print(f"     - Could not find direct PDF link on resource page HTML: {link_text}")
+            return None, None
+        if not pdf_href:
+            print(f"     - Resource page link found, but couldn't extract PDF URL: {link_text}")
+            return None, None
+        pdf_url = urljoin(resource_url, pdf_href)
+        final_filename = filename_from_pdf_url(pdf_url, base_filename_from_link)
+        print(f"     -> Found PDF link on resource page: {final_filename}")
+        return pdf_url, final_filename
+
+    def resolve_and_emit(self, emit, course_key, course_folder, resource_url, link_text):
+        """Resolves a resource page and emits its PDF. Runs on a resolver worker thread."""
+        try:
+            if self.stopped.is_set():
+                return
+            login_generation = self.browser.login_generation
+            try:
+                with self.metrics.stage("resource_page"):
+                    pdf_url, final_filename = self.resolve_resource(resource_url, link_text)
+            except SessionExpired:
+                if not self.browser.relogin(login_generation):
+                    raise
+                with self.metrics.stage("resource_page"):
+                    pdf_url, final_filename = self.resolve_resource(resource_url, link_text)
+            if pdf_url and final_filename:
+                self.manifest.record_resolution(resource_url, pdf_url, final_filename)
+                emit(DownloadJob(course_key, course_folder, pdf_url, final_filename))
+        except SessionExpired as expired:
+            print(f"     ERROR accessing resource page {resource_url}: {expired}")
+            self.summary.record(course_key, "errors")
+        except requests.exceptions.Timeout:
+            print(f"     ERROR accessing resource page (Timeout): {resource_url}")
+            self.summary.record(course_key, "errors")
+        except requests.exceptions.RequestException as req_err:
+            print(f"     ERROR accessing resource page {resource_url}: {req_err}")
+            self.summary.record(course_key, "errors")
+        except Exception as parse_err:
+            print(f"     ERROR parsing resource page {resource_url}: {parse_err}")
+            self.summary.record(course_key, "errors")
+        finally:
+            with self.lock:
+                self.resolving -= 1
@@ -0,0 +1,120 @@
+"""Full-text index of every downloaded PDF, in SQLite FTS5.
+
+Text extraction is CPU-bound, so it runs on a process pool fed by the download stage; the download
+threads only hand over a path and carry on. Extraction needs pypdf (pip3 install pypdf).
+"""
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+def extract_text(path):
+    """Returns ([page text, ...], seconds taken). Runs in a worker process."""
+    start = time.monotonic()
+    reader = pypdf.PdfReader(path)
+    pages = [page.extract_text() or "" for page in reader.pages]
+    return pages, time.monotonic() - start
+
+class TextIndex:
+    """SQLite FTS5 index of PDF text, keyed by content hash, plus which course files hold each PDF."""
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.executescript("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS pdf_text USING fts5(
+                sha256 UNINDEXED, page UNINDEXED, text, tokenize='porter unicode61');
+            CREATE TABLE IF NOT EXISTS indexed (
+                sha256 TEXT PRIMARY KEY, pages INTEGER, error TEXT, indexed_at REAL);
+            CREATE TABLE IF NOT EXISTS documents (
+                path TEXT PRIMARY KEY, course TEXT, sha256 TEXT);
+        """)
+        self.conn.commit()
+
+    def has(self, sha256):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM indexed WHERE sha256 = ?", (sha256,)).fetchone() is not None
+
+    def add_text(self, sha256, pages, error=None):
+        with self.lock:
+            self.conn.execute("DELETE FROM pdf_text WHERE sha256 = ?", (sha256,))
+            self.conn.executemany(
+                "INSERT INTO pdf_text (sha256, page, text) VALUES (?, ?, ?)",
+                ((sha256, number, text) for number, text in enumerate(pages, 1) if text.strip()),
+            )
+            self.conn.execute("INSERT OR REPLACE INTO indexed VALUES (?, ?, ?, ?)", (sha256, len(pages), error, time.time()))
+            self.conn.commit()
+
+    def add_document(self, path, course, sha256):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO documents VALUES (?, ?, ?)", (path, course, sha256))
+            self.conn.commit()
+
+    def search(self, query, limit=20):
+        """Returns (course, path, page, snippet) for the best matches, one row per file and page."""
+        with self.lock:
+            return self.conn.execute("""
+                SELECT d.course, d.path, t.page, snippet(pdf_text, 2, '[', ']', ' ... ', 12)
+                FROM pdf_text t JOIN documents d ON d.sha256 = t.sha256
+                WHERE pdf_text MATCH ? ORDER BY t.rank LIMIT ?
+            """, (query, limit)).fetchall()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class TextIndexer:
+    """Extracts text from finished downloads on a process pool and stores it in a TextIndex."""
+
+    def __init__(self, index, workers, metrics):
+        self.index = index
+        self.metrics = metrics
+        self.pool = ProcessPoolExecutor(max_workers=workers)
+        self.pending = {} # sha256 -> future
+        self.lock = threading.Lock()
+        metrics.watch("extract_pending", lambda: len(self.pending))
+
+    def add(self, sha256, blob_path, filepath, course_key):
+        """Records that filepath holds this PDF and queues its text for extraction if it is new. Never blocks on extraction."""
+        self.index.add_document(filepath, course_key, sha256)
+        with self.lock:
+            if sha256 in self.pending or self.index.has(sha256):
+                return
+            future = self.pool.submit(extract_text, blob_path)
+            self.pending[sha256] = future
+        future.add_done_callback(lambda f: self._store(sha256, os.path.basename(filepath), f))
+
+    def _store(self, sha256, filename, future):
+        if future.cancelled():
+            with self.lock:
+                self.pending.pop(sha256, None)
+            return
+        try:
+            pages, seconds = future.result()
+            self.index.add_text(sha256, pages)
+            self.metrics.record_stage("extract_text", seconds)
+        except Exception as e:
+            # Scanned or broken PDFs: remember the failure so later runs do not retry it every time
+            print(f"   Warning: Could not extract text from {filename}: {e}")
+            self.index.add_text(sha256, [], error=str(e))
+            self.metrics.count("extract_errors")
+        finally:
+            with self.lock:
+                self.pending.pop(sha256, None)
+
+    def join(self):
+        """Waits for the extractions still running."""
+        with self.lock:
+            remaining = len(self.pending)
+        if remaining:
+            print(f"\nWaiting for text extraction of {remaining} PDFs to finish...")
+        self.pool.shutdown(wait=True)
+
+    def shutdown(self):
+        self.pool.shutdown(wait=True, cancel_futures=True)
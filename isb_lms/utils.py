@@ -0,0 +1,67 @@
+"""File name and folder helpers."""
+import os
+import re
+import shutil
+from urllib.parse import unquote
+
+def sanitize_filename(filename):
+    """Removes invalid characters for filenames and cleans up common issues."""
+    try:
+        filename = unquote(str(filename)) # Ensure it's a string before unquote
+    except Exception:
+        pass # Ignore decoding errors, proceed with original
+    filename = filename.strip()
+    filename = re.sub(r'[\\/*?:"<>|]+', "", filename)
+    filename = re.sub(r'\s+', ' ', filename)
+    filename = filename.replace('...', '').replace(':', ' -')
+    while filename.endswith('.') or filename.endswith(' '):
+         filename = filename[:-1]
+    if not filename:
+        filename = "downloaded_file"
+    return filename
+
+def ensure_dir_exists(dir_path):
+    """Creates a directory if it doesn't exist."""
+    if not os.path.exists(dir_path):
+        try:
+            os.makedirs(dir_path)
+            print(f"   Created directory: {dir_path}")
+        except OSError as e:
+             print(f"   ERROR creating directory {dir_path}: {e}")
+             raise # Re-raise the exception to stop processing for this course
+
+def filename_from_pdf_url(pdf_url, fallback_name):
+    """Uses the file name from the PDF URL, or the link text if the URL has no usable name."""
+    filename_from_url = sanitize_filename(os.path.basename(pdf_url.split('?')[0]))
+    return fallback_name if (not filename_from_url or filename_from_url.lower() == ".pdf") else filename_from_url
+
+def filename_from_disposition(content_disposition):
+    """Extracts the file name from a Content-Disposition header, if it has one."""
+    if 'filename=' in content_disposition:
+        disp_match = re.search(r'filename\*?=(?:UTF-8\'\')?([^\s;\"]+|\".*?\")', content_disposition, re.IGNORECASE)
+        if disp_match: return sanitize_filename(disp_match.group(1).strip('"'))
+    return None
+
+def parse_size(text):
+    """Parses a size like '500M', '2.5G' or '1048576' into bytes."""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*', str(text), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"not a size: {text!r} (try e.g. 500M or 2G)")
+    return int(float(match.group(1)) * 1024 ** " KMGT".index(match.group(2).upper() or " "))
+
+def format_size(size):
+    """Formats a byte count for people, e.g. 1.5 GB."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+def disk_free(path):
+    """Free bytes on the disk that holds path, or would hold it once created."""
+    while not os.path.exists(path):
+        parent = os.path.dirname(path)
+        if parent == path:
+            break
+        path = parent
+    return shutil.disk_usage(path).free
@@ -0,0 +1,209 @@
+"""Watch mode: keeps running and downloads new course materials as they are posted.
+
+Each course page is polled with a conditional GET and its resource links are fingerprinted. Only
+courses whose links changed go through the resolve and download stages, and then only for the
+links that are new or renamed. A course's polling interval halves when it changes and grows while
+it does not, within --poll-min and --poll-max. Polling state lives in the manifest rather than in
+memory, so memory stays flat however long it runs and a restart keeps the learned intervals.
+"""
+import random
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .auth import Browser
+from .discover import discover_courses, filter_courses
+from .manifest import Manifest, course_fingerprint
+from .metrics import RunMetrics
+from .net import SessionExpired, create_limiter, create_session, fetch_page_if_changed
+from .parsing import COURSE_CONTENT_SELECTOR, LOGGED_IN_SELECTOR, extract_course_links, html_has
+from .pipeline import login, resolve_and_download, write_run_reports
+from .report import DownloadSummary, print_report
+from .utils import ensure_dir_exists
+
+def next_interval(settings, interval, changed):
+    """Halves the interval after a change and grows it by half otherwise, with some jitter so polls spread out."""
+    interval = interval / 2 if changed else interval * 1.5
+    interval *= random.uniform(0.9, 1.1)
+    return min(settings.watch_max_interval, max(settings.watch_min_interval, interval))
+
+def due_at(manifest, course):
+    """When the course should next be polled (epoch seconds); 0 if it never has been."""
+    state = manifest.get_course_poll(course["url"])
+    return state["checked_at"] + state["interval_s"] if state else 0
+
+class Watcher:
+    """Polls the selected courses forever, downloading whatever is new."""
+
+    def __init__(self, settings):
+        self.settings = settings
+        self.session = create_session(settings.user_agent, pool_size=settings.pool_size)
+        # Long-lived: only the limiter's events and login/discover stages go here, which stay a fixed size.
+        # Every batch of downloads gets its own RunMetrics, which is dropped once its report is written.
+        self.metrics = RunMetrics()
+        self.limiter = create_limiter(settings, self.metrics)
+        self.browser = Browser(settings, self.session, self.limiter, self.metrics)
+        self.manifest = None
+        self.courses = []
+        self.discovered_at = 0
+
+    def discover(self):
+        """Logs in if needed and refreshes the course list, so courses added mid-term are picked up."""
+        settings = self.settings
+        self.browser.relogin_failed = False # Give a manual login another chance after the last one timed out
+        self.discovered_at = time.time() # Even if it fails, so a login that timed out is not asked for again straight away
+        try:
+            if len(self.session.cookies):
+                # The session in use can outlive the saved one's expiry, so only log in again if the LMS rejects it.
+                # Anything else (a timeout, a 5xx) just waits for the next rediscovery with the session kept.
+                login_generation = self.browser.login_generation
+                try:
+                    dashboard_html, _, _ = fetch_page_if_changed(self.session, self.limiter, settings.dashboard_url,
+                                                                 timeout=settings.page_timeout)
+                except SessionExpired:
+                    if not self.browser.relogin(login_generation):
+                        return False
+                    dashboard_html = None
+                except requests.exceptions.RequestException as e:
+                    print(f"\n   Warning: Could not refresh the course list, will try again later: {e}")
+                    return False
+                if dashboard_html and not html_has(dashboard_html, LOGGED_IN_SELECTOR, settings.html_parser):
+                    print("\n   Warning: The dashboard did not look as expected, will try again later.")
+                    return False
+            else:
+                dashboard_html = login(settings, self.session, self.limiter, self.browser, self.metrics)
+            courses = discover_courses(settings, self.session, self.limiter, self.browser, self.metrics, dashboard_html)
+        except Exception as e:
+            print(f"\nError scraping dashboard: {e}")
+            return False
+        courses = filter_courses(settings, courses)
+        if courses:
+            self.courses = courses
+        print(f"Watching {len(self.courses)} courses.")
+        return bool(self.courses)
+
+    def poll(self, course):
+        """Checks one course page. Returns its HTML if its links changed since they were last downloaded, else None."""
+        settings, manifest = self.settings, self.manifest
+        url = course["url"]
+        state = manifest.get_course_poll(url) or {
+            "etag": None, "last_modified": None, "interval_s": settings.watch_interval, "changed_at": None,
+        }
+        login_generation = self.browser.login_generation
+        try:
+            html, etag, last_modified = fetch_page_if_changed(
+                self.session, self.limiter, url, state["etag"], state["last_modified"], settings.page_timeout
+            )
+        except SessionExpired:
+            self.browser.relogin(login_generation)
+            return None # Not recorded, so it is polled again on the next pass
+        except requests.exceptions.RequestException as e:
+            print(f"   Warning: Could not check {course['name']}: {e}")
+            manifest.record_course_poll(url, state["etag"], state["last_modified"], state["interval_s"],
+                                        time.time(), state["changed_at"])
+            return None
+
+        changed = False
+        if html is not None:
+            try:
+                if html_has(html, COURSE_CONTENT_SELECTOR, settings.html_parser):
+                    links = extract_course_links(html, settings.html_parser)
+                    changed = course_fingerprint(links) != manifest.course_fingerprint(url)
+                else:
+                    print(f"   Warning: {course['name']} did not look like a course page, will check again later.")
+                    etag = last_modified = None
+            except Exception as e: # One odd page should not stop the other courses being checked
+                print(f"   Warning: Could not read {course['name']}, will check again later: {e}")
+                etag = last_modified = None
+        if changed:
+            # Not kept until the new links are downloaded, so an interrupted check fetches the page in full again
+            etag = last_modified = None
+        now = time.time()
+        manifest.record_course_poll(url, etag, last_modified, next_interval(settings, state["interval_s"], changed),
+                                    now, now if changed else state["changed_at"])
+        if changed:
+            print(f"   New or changed materials in {course['term']} - {course['name']}")
+        return html if changed else None
+
+    def check(self, due):
+        """Polls the due courses, then resolves and downloads the new links of those that changed."""
+        settings = self.settings
+        print(f"\n[{time.strftime('%Y-%m-%d %H:%M:%S')}] Checking {len(due)} courses for new materials...")
+        with ThreadPoolExecutor(max_workers=settings.course_workers, thread_name_prefix="poll") as pool:
+            pages = {course["url"]: html for course, html in zip(due, pool.map(self.poll, due)) if html}
+        changed = [course for course in due if course["url"] in pages]
+        if not changed:
+            print("   Nothing new.")
+            return
+
+        summary = DownloadSummary()
+        metrics = RunMetrics()
+        metrics.watch("concurrency_limit", self.limiter.concurrency_limit)
+        metrics.watch("requests_per_second", lambda: round(self.limiter.bucket.rate, 2))
+        try:
+            resolve_and_download(settings, self.session, self.limiter, self.browser, self.manifest, summary, metrics,
+                                 changed, pages=pages, new_links_only=True)
+        finally:
+            metrics.finish()
+        print_report(summary, len(changed), settings.download_dir)
+        write_run_reports(settings, metrics, summary)
+
+        # Links count as seen only once everything they led to is on disk. A course with failures or files
+        # skipped for lack of space keeps its old links, so the next poll (soon) emits the missing files again.
+        failed = {key for key, status in summary.items() if status["errors"]}
+        failed.update(row["course"] for row in metrics.files if row["outcome"] == "no_space")
+        for course in changed:
+            url = course["url"]
+            if f"{course['term']} - {course['name']}" in failed:
+                state = self.manifest.get_course_poll(url)
+                self.manifest.record_course_poll(url, None, None, settings.watch_min_interval, time.time(),
+                                                 state and state["changed_at"])
+            else:
+                links = extract_course_links(pages[url], settings.html_parser)
+                self.manifest.set_course_links(url, links)
+                self.manifest.set_course_fingerprint(url, course_fingerprint(links))
+
+    def run(self):
+        settings = self.settings
+        print("Starting LMS PDF Downloader in watch mode (Ctrl+C to stop)...")
+        print(f"Downloads will be saved to: {settings.download_dir}")
+        ensure_dir_exists(settings.download_dir)
+        self.manifest = Manifest(settings.manifest_path, settings.download_dir)
+        try:
+            if not self.discover():
+                print("\nERROR: No courses found to watch.")
+                return False
+            failures = 0
+            while True:
+                try:
+                    if time.time() - self.discovered_at >= settings.watch_rediscover_interval:
+                        self.discover()
+                    now = time.time()
+                    due = [course for course in self.courses if due_at(self.manifest, course) <= now]
+                    if due:
+                        self.check(due)
+                    wake = min([due_at(self.manifest, course) for course in self.courses]
+                               + [self.discovered_at + settings.watch_rediscover_interval])
+                    wait = max(1.0, wake - time.time())
+                    failures = 0
+                except Exception:
+                    # Whatever went wrong (a full disk, a locked database, an odd page), keep watching after a pause
+                    failures += 1
+                    wait = min(settings.watch_max_interval, settings.watch_min_interval * 2 ** (failures - 1))
+                    print("\nERROR in watch mode:")
+                    traceback.print_exc()
+                print(f"Next check in {wait / 60:.1f} minutes." if wait >= 120 else f"Next check in {wait:.0f} seconds.")
+                time.sleep(wait)
+        except KeyboardInterrupt:
+            print("\nStopping watch mode.")
+            return True
+        finally:
+            self.manifest.close()
+            self.browser.quit()
+            self.metrics.finish()
+
+def watch(settings):
+    """Runs watch mode until interrupted. Returns False if there was nothing to watch."""
+    return Watcher(settings).run()
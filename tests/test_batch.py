@@ -0,0 +1,81 @@
+import threading
+
+from isb_lms.batch import FairPool
+
+def run_queued(pool, submissions):
+    """Holds the pool's only worker busy while (lane, label) work is queued, then runs it and returns the order."""
+    order = []
+    gate = threading.Event()
+    blocker = submissions[0][0].submit(gate.wait)
+    futures = [lane.submit(order.append, label) for lane, label in submissions]
+    gate.set()
+    blocker.result(timeout=5)
+    for future in futures:
+        future.result(timeout=5)
+    return order
+
+def test_accounts_take_turns():
+    pool = FairPool(workers=1, per_account=1)
+    try:
+        busy, quiet = pool.lane("busy@isb"), pool.lane("quiet@isb")
+        submissions = [(busy, f"busy-{i}") for i in range(4)] + [(quiet, f"quiet-{i}") for i in range(2)]
+        order = run_queued(pool, submissions)
+    finally:
+        pool.shutdown()
+    # The quiet account is not stuck behind everything the busy one queued first
+    assert [label.split("-")[0] for label in order[:4]] in (["quiet", "busy", "quiet", "busy"],
+                                                            ["busy", "quiet", "busy", "quiet"])
+    assert order[4:] == ["busy-2", "busy-3"]
+
+def test_jobs_of_one_account_take_turns():
+    pool = FairPool(workers=1, per_account=1)
+    try:
+        first, second = pool.lane("student@isb"), pool.lane("student@isb")
+        order = run_queued(pool, [(first, "first-0"), (first, "first-1"), (first, "first-2"), (second, "second-0")])
+    finally:
+        pool.shutdown()
+    assert order.index("second-0") <= 1
+
+def test_per_account_cap_limits_concurrency():
+    pool = FairPool(workers=4, per_account=2)
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+    release = threading.Event()
+
+    def task():
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        release.wait(5)
+        with lock:
+            active -= 1
+
+    try:
+        lane = pool.lane("student@isb")
+        futures = [lane.submit(task) for _ in range(6)]
+        threading.Event().wait(0.2)
+        release.set()
+        for future in futures:
+            future.result(timeout=5)
+    finally:
+        pool.shutdown()
+    assert peak == 2
+
+def test_lane_shutdown_cancels_only_its_own_work():
+    pool = FairPool(workers=1, per_account=1)
+    started, gate = threading.Event(), threading.Event()
+    try:
+        a, b = pool.lane("a@isb"), pool.lane("b@isb")
+        blocker = a.submit(lambda: (started.set(), gate.wait()))
+        assert started.wait(5)
+        dropped = a.submit(lambda: "a")
+        kept = b.submit(lambda: "b")
+        a.shutdown(wait=False, cancel_futures=True)
+        gate.set()
+        blocker.result(timeout=5)
+        assert kept.result(timeout=5) == "b"
+        assert dropped.cancelled()
+    finally:
+        pool.shutdown()
@@ -0,0 +1,63 @@
+import hashlib
+import os
+
+import pytest
+
+from isb_lms.blobstore import BlobStore
+
+CONTENT = b"%PDF-1.4 shared reading"
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+def pdf_copies(root):
+    """Paths under root holding a file with CONTENT, counting hardlinks to the same inode once."""
+    inodes = {}
+    for folder, _, files in os.walk(root):
+        for name in files:
+            path = os.path.join(folder, name)
+            with open(path, "rb") as f:
+                if f.read() == CONTENT:
+                    inodes.setdefault(os.stat(path).st_ino, path)
+    return list(inodes.values())
+
+def link(tmp_path, blobs, course):
+    (tmp_path / course).mkdir(parents=True, exist_ok=True)
+    blobs.link_into(SHA256, str(tmp_path / course / "reading.pdf"))
+
+def download(tmp_path, blobs, course):
+    part_path = tmp_path / course / "reading.pdf.part"
+    part_path.parent.mkdir(parents=True, exist_ok=True)
+    part_path.write_bytes(CONTENT)
+    blobs.ingest(str(part_path), SHA256)
+    blobs.link_into(SHA256, str(tmp_path / course / "reading.pdf"))
+
+@pytest.fixture(params=["disabled", "unsupported"])
+def no_hardlink_store(request, tmp_path, monkeypatch):
+    if request.param == "disabled":
+        return BlobStore(str(tmp_path / ".blobs"), use_hardlinks=False)
+    def no_link(src, dst):
+        raise OSError("hardlinks not supported on this drive")
+    monkeypatch.setattr(os, "link", no_link)
+    return BlobStore(str(tmp_path / ".blobs"))
+
+def test_without_hardlinks_a_download_is_stored_once(tmp_path, no_hardlink_store):
+    download(tmp_path, no_hardlink_store, "Course A")
+    assert pdf_copies(tmp_path) == [str(tmp_path / "Course A" / "reading.pdf")]
+    assert no_hardlink_store.source(SHA256) == str(tmp_path / "Course A" / "reading.pdf")
+
+def test_without_hardlinks_duplicates_are_copied_from_the_course_copy(tmp_path, no_hardlink_store):
+    download(tmp_path, no_hardlink_store, "Course A")
+    link(tmp_path, no_hardlink_store, "Course B")
+    assert sorted(pdf_copies(tmp_path)) == [str(tmp_path / "Course A" / "reading.pdf"),
+                                            str(tmp_path / "Course B" / "reading.pdf")]
+
+def test_changed_course_copy_is_no_longer_a_source(tmp_path, no_hardlink_store):
+    download(tmp_path, no_hardlink_store, "Course A")
+    (tmp_path / "Course A" / "reading.pdf").write_bytes(b"%PDF-1.4 edited by hand")
+    assert not no_hardlink_store.has(SHA256)
+
+def test_with_hardlinks_courses_share_one_inode(tmp_path):
+    blobs = BlobStore(str(tmp_path / ".blobs"))
+    download(tmp_path, blobs, "Course A")
+    link(tmp_path, blobs, "Course B")
+    assert len(pdf_copies(tmp_path)) == 1
+    assert blobs.source(SHA256) == blobs.path_for(SHA256)
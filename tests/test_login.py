@@ -0,0 +1,70 @@
+import threading
+import time
+from dataclasses import replace
+
+import pytest
+
+from isb_lms import auth, pipeline
+from isb_lms.auth import Browser
+from isb_lms.config import Settings
+from isb_lms.metrics import RunMetrics
+from isb_lms.net import create_limiter, create_session
+
+GOOD_COOKIE = {"name": "MoodleSession", "value": "logged-in", "path": "/"}
+
+class FakeDriver:
+    def get(self, url):
+        pass
+
+    def get_cookies(self):
+        return [GOOD_COOKIE]
+
+    def quit(self):
+        pass
+
+@pytest.fixture
+def lms(monkeypatch):
+    """A stand-in LMS that accepts GOOD_COOKIE, with a Chrome that counts how often it asks for a login."""
+    state = {"browsers": 0, "prompts": 0}
+    lock = threading.Lock()
+
+    def start_browser(user_agent):
+        with lock:
+            state["browsers"] += 1
+        return FakeDriver()
+
+    def wait_for_manual_login(driver, timeout):
+        with lock:
+            state["prompts"] += 1
+        time.sleep(0.2) # The user typing their password
+
+    def fetch_page(session, limiter, url, *args, **kwargs):
+        return "<html>dashboard</html>" if session.cookies.get("MoodleSession") == "logged-in" else None
+
+    monkeypatch.setattr(auth, "start_browser", start_browser)
+    monkeypatch.setattr(auth, "wait_for_manual_login", wait_for_manual_login)
+    monkeypatch.setattr(pipeline, "fetch_page", fetch_page)
+    return state
+
+def test_jobs_of_one_account_share_a_single_login(tmp_path, lms):
+    settings = replace(Settings(), session_store=str(tmp_path / "session.json"))
+    login_lock = threading.RLock()
+    results = []
+
+    def job():
+        metrics = RunMetrics()
+        session = create_session(settings.user_agent, pool_size=2)
+        limiter = create_limiter(settings, metrics)
+        browser = Browser(settings, session, limiter, metrics, login_lock)
+        pipeline.login(settings, session, limiter, browser, metrics)
+        results.append(session.cookies.get("MoodleSession"))
+        browser.quit()
+
+    threads = [threading.Thread(target=job) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert results == ["logged-in"] * 3
+    assert lms["prompts"] == 1
+    assert lms["browsers"] == 1
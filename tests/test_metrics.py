@@ -0,0 +1,54 @@
+import re
+
+import pytest
+
+from isb_lms.metrics import RunMetrics
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{[^}]*\})? (\S+)$')
+
+@pytest.fixture
+def prom_file(tmp_path):
+    metrics = RunMetrics()
+    with metrics.stage("download"):
+        pass
+    metrics.record_file("Term_6 - Strategy", "Reading 1.pdf", "downloaded", "https://lms/r1.pdf", 1000, 0.5)
+    metrics.record_file("Term_6 - Strategy", "Reading 2.pdf", "linked", "https://lms/r2.pdf")
+    metrics.count("retry", 3)
+    metrics.watch("download_queue", lambda: 2)
+    metrics.sample()
+    metrics.finish()
+    path = tmp_path / "lms.prom"
+    metrics.write_prometheus(str(path))
+    return path.read_text()
+
+def test_every_sample_belongs_to_its_declared_family(prom_file):
+    types = {}
+    for line in prom_file.splitlines():
+        if line.startswith("# TYPE "):
+            _, _, name, kind = line.split()
+            types[name] = kind
+            continue
+        if line.startswith("# HELP "):
+            continue
+        assert not line.startswith("#"), line # No OpenMetrics-only lines such as # UNIT or # EOF
+        match = SAMPLE.match(line)
+        assert match, line
+        name = match.group(1)
+        family = re.sub(r"_(count|sum)$", "", name) if name not in types else name
+        assert family in types, f"{name} has no # TYPE line"
+        if types[family] == "counter":
+            assert family.endswith("_total")
+        float(match.group(3))
+    assert types["lms_files_total"] == "counter"
+    assert 'lms_files_total{outcome="downloaded"} 1' in prom_file
+    assert "lms_transferred_bytes_total 1000" in prom_file
+    assert 'lms_events_total{event="retry"} 3' in prom_file
+
+def test_prometheus_client_parses_the_file(prom_file):
+    parser = pytest.importorskip("prometheus_client.parser")
+    families = {family.name: family for family in parser.text_string_to_metric_families(prom_file)}
+    # prometheus_client names counter families without the _total suffix
+    files = families["lms_files"]
+    assert files.type == "counter"
+    assert {sample.labels["outcome"]: sample.value for sample in files.samples} == {"downloaded": 1, "linked": 1}
+    assert families["lms_stage_seconds"].type == "summary"
@@ -0,0 +1,111 @@
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+
+from isb_lms import net
+from isb_lms.net import CircuitBreaker, HostLimiter, RetryPolicy, parse_retry_after
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.elapsed = timedelta(milliseconds=5)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class FakeSession:
+    """Answers each request with the next of the given responses."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = 0
+
+    def request(self, method, url, **kwargs):
+        self.requests += 1
+        return self.responses.pop(0)
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Records the limiter's backoff sleeps instead of waiting."""
+    recorded = []
+    monkeypatch.setattr(net.time, "sleep", recorded.append)
+    return recorded
+
+def test_parse_retry_after_forms():
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    in_a_minute = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 60))
+    assert 55 <= parse_retry_after(in_a_minute) <= 60
+
+def test_retry_after_takes_precedence_over_backoff_and_is_capped():
+    policy = RetryPolicy(attempts=5, base_delay=1.0, max_delay=2.0, max_retry_after=30.0)
+    assert 10 <= policy.delay(1, retry_after=10) <= 11
+    assert 30 <= policy.delay(1, retry_after=600) <= 31
+    assert all(0 <= policy.delay(attempt) <= 2.0 for attempt in range(1, 10))
+
+def test_limiter_waits_as_long_as_retry_after_says(sleeps):
+    limiter = HostLimiter(per_host=2, rate=1000, burst=10, retry=RetryPolicy(attempts=3, base_delay=0.01))
+    session = FakeSession(FakeResponse(429, {"retry-after": "7"}), FakeResponse(200))
+    with limiter.request(session, "GET", "https://lms.example/file.pdf") as response:
+        assert response.status_code == 200
+    assert session.requests == 2
+    assert len(sleeps) == 1 and 7 <= sleeps[0] <= 8
+
+def test_limiter_yields_the_last_throttled_response_when_attempts_run_out(sleeps):
+    limiter = HostLimiter(per_host=2, rate=1000, burst=10, retry=RetryPolicy(attempts=2, base_delay=0.01))
+    session = FakeSession(FakeResponse(503, {"retry-after": "1"}), FakeResponse(503, {"retry-after": "1"}))
+    with limiter.request(session, "GET", "https://lms.example/file.pdf") as response:
+        assert response.status_code == 503
+    assert session.requests == 2
+
+def returns_within(fn, seconds):
+    """Runs fn on a thread; returns True if it finished within the given time."""
+    thread = threading.Thread(target=fn, daemon=True)
+    thread.start()
+    thread.join(seconds)
+    return not thread.is_alive()
+
+def test_breaker_opens_after_threshold_failures_and_blocks_requests():
+    breaker = CircuitBreaker("lms.example", threshold=3, cooldown=0.3)
+    assert breaker.record_failure() is False
+    assert breaker.record_failure() is False
+    assert breaker.record_failure() is True
+    assert breaker.state == "open"
+    assert not returns_within(breaker.before_request, 0.1)
+
+def test_breaker_half_open_lets_one_probe_through_then_closes_on_success():
+    breaker = CircuitBreaker("lms.example", threshold=1, cooldown=0.1)
+    breaker.record_failure()
+    started = time.monotonic()
+    breaker.before_request() # The probe, once the cooldown is over
+    assert time.monotonic() - started >= 0.09
+    assert breaker.state == "half-open"
+    second = threading.Thread(target=breaker.before_request, daemon=True)
+    second.start()
+    second.join(0.1)
+    assert second.is_alive() # Only one probe at a time
+    breaker.record_success()
+    second.join(1.0)
+    assert not second.is_alive()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+def test_breaker_failed_probe_reopens_for_twice_as_long():
+    breaker = CircuitBreaker("lms.example", threshold=1, cooldown=0.05)
+    breaker.record_failure()
+    breaker.before_request()
+    assert breaker.record_failure() is True
+    assert breaker.state == "open"
+    assert breaker.cooldown == pytest.approx(0.1)
+    breaker.before_request()
+    breaker.record_success()
+    assert breaker.cooldown == pytest.approx(0.05) # Back to the base cooldown once the host recovers
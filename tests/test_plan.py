@@ -0,0 +1,154 @@
+import hashlib
+import os
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+
+from isb_lms import plan
+from isb_lms.blobstore import BlobStore
+from isb_lms.download import DownloadQueue
+from isb_lms.manifest import Manifest
+from isb_lms.metrics import RunMetrics
+from isb_lms.plan import PlannedFile, apply_budget, classify, order_plan, print_plan
+from isb_lms.report import DownloadSummary
+from isb_lms.resolve import DownloadJob
+
+MB = 1000 ** 2
+
+def settings(**overrides):
+    values = dict(download_dir="/downloads", min_free_space=0, disk_budget=None,
+                  download_order="resolved", course_priority=[])
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+def planned(name, size, status="download", course="Term_6 - Strategy", url=None):
+    job = DownloadJob(course, f"/downloads/Term_6/{course}", url or f"https://lms/{name}.pdf", name)
+    return PlannedFile(job, status, size)
+
+@pytest.fixture(autouse=True)
+def free_space(monkeypatch):
+    monkeypatch.setattr(plan, "disk_free", lambda path: 100 * MB)
+
+def names(items):
+    return [item.job.filename for item in items]
+
+def test_smallest_first_puts_free_work_first_and_unknown_sizes_last():
+    items = [planned("big", 30 * MB), planned("unknown", None), planned("small", 1 * MB),
+             planned("check", 0, status="revalidate")]
+    assert names(order_plan(settings(download_order="smallest"), items)) == ["check", "small", "big", "unknown"]
+
+def test_priority_courses_first_then_smallest():
+    items = [planned("other", 1 * MB, course="Term_6 - Finance"), planned("big", 20 * MB, course="Term_6 - Strategy"),
+             planned("small", 2 * MB, course="Term_6 - Strategy")]
+    ordered = order_plan(settings(download_order="priority", course_priority=["strategy"]), items)
+    assert names(ordered) == ["small", "big", "other"]
+
+def test_budget_keeps_files_in_order_until_the_first_that_does_not_fit():
+    items = [planned("a", 40 * MB), planned("b", 40 * MB), planned("c", 40 * MB), planned("d", 1 * MB)]
+    kept, deferred, budget = apply_budget(settings(disk_budget=90 * MB), items)
+    assert budget == 90 * MB
+    assert names(kept) == ["a", "b"]
+    # d would fit, but is left for later too so the next run carries on in the same order
+    assert names(deferred) == ["c", "d"]
+
+def test_budget_is_free_space_less_min_free_when_smaller():
+    items = [planned("a", 50 * MB), planned("b", 40 * MB)]
+    kept, deferred, budget = apply_budget(settings(min_free_space=20 * MB, disk_budget=500 * MB), items)
+    assert budget == 80 * MB
+    assert names(kept) == ["a"] and names(deferred) == ["b"]
+
+def test_unknown_sizes_count_as_the_average_known_size():
+    items = [planned("a", 30 * MB), planned("b", 10 * MB), planned("unknown", None)]
+    kept, deferred, _ = apply_budget(settings(disk_budget=55 * MB), items)
+    assert names(kept) == ["a", "b"] and names(deferred) == ["unknown"] # 20 MB assumed, 60 MB in all
+
+def test_links_follow_their_download_and_revalidations_always_go_ahead():
+    items = [planned("a", 60 * MB), planned("b", 60 * MB, url="https://lms/shared.pdf"),
+             planned("b-copy", 0, status="link", url="https://lms/shared.pdf"),
+             planned("a-copy", 0, status="link", url="https://lms/a.pdf"),
+             planned("check", 0, status="revalidate")]
+    kept, deferred, _ = apply_budget(settings(disk_budget=100 * MB), items)
+    assert names(kept) == ["a", "a-copy", "check"]
+    assert names(deferred) == ["b", "b-copy"]
+
+class RecordingPool:
+    """Stands in for the download pool: records what would be downloaded instead of fetching it."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, fn, course_key, pdf_url, filepath, final_filename, known):
+        self.submitted.append((final_filename, "revalidate" if known else "download"))
+        return Future()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+@pytest.fixture
+def download_dir(tmp_path):
+    """A download folder with a few files from earlier runs, and the jobs a new run resolved for it."""
+    for course in ("Strategy", "Finance"):
+        (tmp_path / "Term_6" / course).mkdir(parents=True)
+    manifest = Manifest(str(tmp_path / ".lms_manifest.sqlite"), str(tmp_path))
+    blobs = BlobStore(str(tmp_path / ".blobs"))
+    strategy, finance = str(tmp_path / "Term_6" / "Strategy"), str(tmp_path / "Term_6" / "Finance")
+    (tmp_path / "Term_6" / "Strategy" / "Old Notes.pdf").write_bytes(b"%PDF- saved by hand")
+    (tmp_path / "Term_6" / "Strategy" / "Syllabus.pdf").write_bytes(b"%PDF- syllabus")
+    manifest.record_file(os.path.join(strategy, "Syllabus.pdf"), "https://lms/syllabus.pdf", '"v1"', None, 14, "0" * 64)
+    content = b"%PDF- case"
+    sha256 = hashlib.sha256(content).hexdigest()
+    part = tmp_path / "case.part"
+    part.write_bytes(content)
+    blobs.ingest(str(part), sha256)
+    manifest.record_url_hash("https://lms/case.pdf", sha256, '"c1"', None, len(content))
+    jobs = [
+        DownloadJob("Term_6 - Strategy", strategy, "https://lms/old-notes.pdf", "Old Notes"),
+        DownloadJob("Term_6 - Strategy", strategy, "https://lms/syllabus.pdf", "Syllabus.pdf"),
+        DownloadJob("Term_6 - Strategy", strategy, "https://lms/reading.pdf", "Reading.pdf"),
+        DownloadJob("Term_6 - Strategy", strategy, "https://lms/reading.pdf", "Reading.pdf"),
+        DownloadJob("Term_6 - Finance", finance, "https://lms/reading.pdf", "Reading.pdf"),
+        DownloadJob("Term_6 - Finance", finance, "https://lms/case.pdf", "Case.pdf"),
+        DownloadJob("Term_6 - Finance", finance, "https://lms/other-reading.pdf", "Reading.pdf"),
+    ]
+    yield SimpleNamespace(path=tmp_path, manifest=manifest, blobs=blobs, jobs=jobs)
+    manifest.close()
+
+def test_plan_and_download_queue_make_the_same_decisions(download_dir):
+    d = download_dir
+    statuses = [(item.job.course_key, item.job.filename, item.status) for item in classify(d.jobs, d.manifest, d.blobs)]
+    assert statuses == [
+        ("Term_6 - Strategy", "Old Notes", "exists"),
+        ("Term_6 - Strategy", "Syllabus.pdf", "revalidate"),
+        ("Term_6 - Strategy", "Reading.pdf", "download"),
+        ("Term_6 - Finance", "Reading.pdf", "link"),
+        ("Term_6 - Finance", "Case.pdf", "link"),
+        ("Term_6 - Finance", "Reading.pdf", "exists"), # Another URL already writes Finance/Reading.pdf
+    ]
+
+    pool = RecordingPool()
+    metrics = RunMetrics()
+    summary = DownloadSummary()
+    for course_key in ("Term_6 - Strategy", "Term_6 - Finance"):
+        summary.add_course(course_key)
+    queue = DownloadQueue(None, None, d.manifest, d.blobs, summary, metrics, SimpleNamespace(download_workers=1), None,
+                          pool=pool)
+    for job in d.jobs:
+        queue.enqueue(*job)
+    metrics.finish()
+    outcomes = {"exists": "exists", "linked": "link"}
+    handled = [(row["course"], row["filename"], outcomes[row["outcome"]]) for row in metrics.files]
+    handled += [("Term_6 - Strategy", filename, status) for filename, status in pool.submitted]
+    handled += [("Term_6 - Finance", filename, "link") for _, _, filename in queue.waiting["https://lms/reading.pdf"]]
+    expected = [(course_key, filename if filename.endswith(".pdf") else filename + ".pdf", status)
+                for course_key, filename, status in statuses]
+    assert sorted(handled) == sorted(expected)
+
+def test_plan_lists_the_files_left_for_a_later_run(capsys):
+    items = [planned("a", 60 * MB), planned("b", 60 * MB), planned("c", None)]
+    kept, deferred, budget = apply_budget(settings(disk_budget=100 * MB), items)
+    print_plan(settings(), items, deferred, budget, None)
+    output = capsys.readouterr().out
+    assert "Disk budget reached: 2 PDFs (57.2 MB) are left for a later run:" in output
+    assert os.path.join("Term_6", "Term_6 - Strategy", "b.pdf") in output
+    assert os.path.join("Term_6", "Term_6 - Strategy", "c.pdf") + " (size unknown)" in output
@@ -0,0 +1,84 @@
+import sqlite3
+from dataclasses import replace
+
+import pytest
+import requests
+
+from isb_lms import watch
+from isb_lms.config import Settings
+from isb_lms.manifest import Manifest
+from isb_lms.net import SessionExpired
+from isb_lms.watch import Watcher
+
+@pytest.fixture
+def watcher(tmp_path, monkeypatch):
+    settings = replace(Settings(), download_dir=str(tmp_path), session_store=str(tmp_path / "session.json"))
+    watcher = Watcher(settings)
+    watcher.session.cookies.set("MoodleSession", "still-good")
+    watcher.relogins = []
+    monkeypatch.setattr(watcher.browser, "relogin", lambda generation: watcher.relogins.append(generation) or False)
+    return watcher
+
+def failing_fetch(error):
+    def fetch(*args, **kwargs):
+        raise error
+    return fetch
+
+@pytest.mark.parametrize("error", [requests.exceptions.ConnectTimeout("timed out"),
+                                   requests.exceptions.ConnectionError("name resolution failed"),
+                                   requests.exceptions.HTTPError("503 Server Error")])
+def test_rediscovery_keeps_the_session_through_network_errors(watcher, monkeypatch, error):
+    monkeypatch.setattr(watch, "fetch_page_if_changed", failing_fetch(error))
+    assert watcher.discover() is False
+    assert watcher.relogins == []
+    assert watcher.session.cookies.get("MoodleSession") == "still-good"
+
+def test_rediscovery_does_not_log_in_over_an_unexpected_page(watcher, monkeypatch):
+    monkeypatch.setattr(watch, "fetch_page_if_changed", lambda *a, **k: ("<html>Down for maintenance</html>", None, None))
+    assert watcher.discover() is False
+    assert watcher.relogins == []
+
+def test_rediscovery_logs_in_again_when_sent_to_the_login_page(watcher, monkeypatch):
+    monkeypatch.setattr(watch, "fetch_page_if_changed", failing_fetch(SessionExpired("redirected to the login page")))
+    assert watcher.discover() is False
+    assert watcher.relogins == [0]
+
+def test_unexpected_errors_back_off_and_keep_watching(watcher, monkeypatch):
+    course = {"term": "Term_6", "name": "Strategy", "url": "https://lms/course/view.php?id=1"}
+
+    def discover():
+        watcher.courses = [course]
+        watcher.discovered_at = watch.time.time()
+        return True
+
+    checks = []
+    def check(due):
+        checks.append(due)
+        if len(checks) < 3:
+            raise sqlite3.OperationalError("database is locked") if len(checks) == 1 else OSError(28, "No space left")
+
+    sleeps = []
+    def sleep(seconds):
+        sleeps.append(seconds)
+        if len(sleeps) == 3:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(watcher, "discover", discover)
+    monkeypatch.setattr(watcher, "check", check)
+    monkeypatch.setattr(watch.time, "sleep", sleep)
+    assert watcher.run() is True
+    assert len(checks) == 3
+    settings = watcher.settings
+    assert sleeps[:2] == [settings.watch_min_interval, settings.watch_min_interval * 2]
+
+def test_an_unreadable_course_page_does_not_stop_the_check(watcher, monkeypatch, tmp_path):
+    watcher.manifest = Manifest(str(tmp_path / "manifest.sqlite"), str(tmp_path))
+    monkeypatch.setattr(watch, "fetch_page_if_changed", lambda *a, **k: ("<html>odd</html>", '"v1"', None))
+    def broken_parser(*args):
+        raise ValueError("unexpected markup")
+    monkeypatch.setattr(watch, "html_has", broken_parser)
+    course = {"term": "Term_6", "name": "Strategy", "url": "https://lms/course/view.php?id=1"}
+    assert watcher.poll(course) is None
+    state = watcher.manifest.get_course_poll(course["url"])
+    assert state["etag"] is None # Fetched in full again next time
+    watcher.manifest.close()